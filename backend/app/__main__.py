@@ -3,5 +3,24 @@ Entrypoint for running the FastAPI app directly (optional).
 """
 import uvicorn
 
+from . import config
+from .socket_activation import listen_fd
+
 if __name__ == "__main__":
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
+    fd = listen_fd()
+    if fd is not None:
+        # Socket-activated (production): serve on the socket systemd already bound
+        print(f"Using socket-activated listener on fd {fd}")
+        uvicorn.run(
+            "app.main:app",
+            fd=fd,
+            ws_per_message_deflate=config.WS_PER_MESSAGE_DEFLATE,
+        )
+    else:
+        uvicorn.run(
+            "app.main:app",
+            host="0.0.0.0",
+            port=8000,
+            reload=True,
+            ws_per_message_deflate=config.WS_PER_MESSAGE_DEFLATE,
+        )
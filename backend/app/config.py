@@ -3,6 +3,7 @@ Configuration loader for backend (env or defaults).
 """
 import os
 import platform
+import tempfile
 
 def get_default_serial_port():
     """Get the default serial port based on the operating system."""
@@ -22,3 +23,65 @@ def get_default_serial_port():
 
 SERIAL_PORT = os.getenv("SERIAL_PORT", get_default_serial_port())
 SERIAL_BAUDRATE = int(os.getenv("SERIAL_BAUDRATE", "115200"))
+
+# Optional upstream forwarding (disabled when FORWARD_URL is empty).
+# Supported schemes: http://, https://, mqtt://host:port/topic
+FORWARD_URL = os.getenv("FORWARD_URL", "")
+FORWARD_BATCH_SIZE = int(os.getenv("FORWARD_BATCH_SIZE", "50"))
+FORWARD_FLUSH_INTERVAL = float(os.getenv("FORWARD_FLUSH_INTERVAL", "5.0"))
+FORWARD_SPOOL_DIR = os.getenv(
+    "FORWARD_SPOOL_DIR",
+    os.path.join(tempfile.gettempdir(), "weight-exhibit", "spool"),
+)
+FORWARD_MAX_SPOOL_FILES = int(os.getenv("FORWARD_MAX_SPOOL_FILES", "1000"))
+
+# Profiling/memory endpoints under /debug are only served when explicitly enabled
+DEBUG_ENDPOINTS = os.getenv("DEBUG_ENDPOINTS", "0").lower() in ("1", "true", "yes")
+DEBUG_PROFILE_MAX_SECONDS = float(os.getenv("DEBUG_PROFILE_MAX_SECONDS", "30"))
+
+# Seconds between WebSocket heartbeat frames when no new sample arrives
+WS_SEND_INTERVAL = float(os.getenv("WS_SEND_INTERVAL", "1.0"))
+
+# permessage-deflate for /ws (uvicorn). Packed binary frames gain little from it,
+# so constrained deployments serving mostly f32 clients can turn it off
+WS_PER_MESSAGE_DEFLATE = os.getenv("WS_PER_MESSAGE_DEFLATE", "1").lower() in ("1", "true", "yes")
+
+# New samples are pushed immediately, but never faster than this per client
+WS_MIN_SEND_INTERVAL = float(os.getenv("WS_MIN_SEND_INTERVAL", "0.05"))
+
+# Upper bound for /api/weight?after_seq=N&timeout=T long-polls
+LONG_POLL_MAX_TIMEOUT = float(os.getenv("LONG_POLL_MAX_TIMEOUT", "60"))
+
+# Last sample and calibration are persisted here across restarts (empty disables).
+# Under systemd, StateDirectory= provides STATE_DIRECTORY.
+STATE_FILE = os.getenv(
+    "STATE_FILE",
+    os.path.join(
+        os.getenv("STATE_DIRECTORY") or os.path.join(tempfile.gettempdir(), "weight-exhibit"),
+        "state.json",
+    ),
+)
+STATE_SAVE_INTERVAL = float(os.getenv("STATE_SAVE_INTERVAL", "30"))
+# A restored reading older than this is not shown (seq and calibration still are)
+STATE_MAX_SAMPLE_AGE = float(os.getenv("STATE_MAX_SAMPLE_AGE", "60"))
+
+# Samples retained for /api/history (and relay backfill)
+HISTORY_SIZE = int(os.getenv("HISTORY_SIZE", "3600"))
+
+# Relay/mirror mode: when set (e.g. http://exhibit-a:8000), samples are read from
+# that backend instead of SERIAL_PORT and re-served with the upstream sequence IDs
+RELAY_UPSTREAM = os.getenv("RELAY_UPSTREAM", "")
+RELAY_POLL_TIMEOUT = float(os.getenv("RELAY_POLL_TIMEOUT", "25"))
+
+# Chart history for /api/history?points=N (about two hours at 5 samples/s)
+CHART_HISTORY_SIZE = int(os.getenv("CHART_HISTORY_SIZE", "36000"))
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "2000"))
+CHART_MAX_WINDOW = float(os.getenv("CHART_MAX_WINDOW", "7200"))
+# Chart history is saved next to STATE_FILE this often, and (unsynced) at shutdown
+CHART_SAVE_INTERVAL = float(os.getenv("CHART_SAVE_INTERVAL", "300"))
+
+# Data-freshness watchdog: restart the reader when no sample arrived for WATCHDOG_SLO
+# seconds (0 disables). Repeated restarts back off up to WATCHDOG_MAX_BACKOFF.
+WATCHDOG_SLO = float(os.getenv("WATCHDOG_SLO", "10"))
+WATCHDOG_INTERVAL = float(os.getenv("WATCHDOG_INTERVAL", "1.0"))
+WATCHDOG_MAX_BACKOFF = float(os.getenv("WATCHDOG_MAX_BACKOFF", "300"))
@@ -0,0 +1,117 @@
+"""
+Diagnostics: On-demand stack sampling profiler and tracemalloc snapshots.
+
+Nothing here runs until it is asked to: the sampler thread only exists for
+the duration of a profile request, and tracemalloc is only started by an
+explicit memory request (and can be stopped again the same way).
+"""
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Optional
+
+_profile_lock = threading.Lock()
+_memory_lock = threading.Lock()
+_last_snapshot: Optional[tracemalloc.Snapshot] = None
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profile is requested while another one is still running."""
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def _collapse(frame) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return ";".join(labels)
+
+
+def sample_stacks(seconds: float, interval: float = 0.01) -> Counter:
+    """Sample the stacks of every thread for `seconds` and count identical stacks.
+
+    Keys are collapsed stacks (``thread;outer;...;inner``) as consumed by
+    flamegraph.pl / speedscope; values are sample counts.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running")
+    try:
+        own_id = threading.get_ident()
+        counts: Counter = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                thread_name = names.get(thread_id, f"thread-{thread_id}").replace(";", "_")
+                counts[f"{thread_name};{_collapse(frame)}"] += 1
+            time.sleep(interval)
+        return counts
+    finally:
+        _profile_lock.release()
+
+
+def format_collapsed(counts: Counter) -> str:
+    """Render sample counts in collapsed-stack format, heaviest stacks first."""
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+def memory_report(limit: int = 20, stop: bool = False) -> dict:
+    """Start tracemalloc on first use, then report top allocators and the diff since the last call."""
+    global _last_snapshot
+    with _memory_lock:
+        if stop:
+            was_tracing = tracemalloc.is_tracing()
+            tracemalloc.stop()
+            _last_snapshot = None
+            return {"tracing": False, "stopped": was_tracing}
+
+        if not tracemalloc.is_tracing():
+            # The report groups by line, so one frame per allocation is all it reads
+            tracemalloc.start(1)
+            _last_snapshot = tracemalloc.take_snapshot()
+            return {
+                "tracing": True,
+                "started": True,
+                "message": "tracemalloc started; call again to see allocations since now",
+            }
+
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+        top = [
+            {"location": str(stat.traceback[0]), "size_bytes": stat.size, "count": stat.count}
+            for stat in snapshot.statistics("lineno")[:limit]
+        ]
+        diff = []
+        if _last_snapshot is not None:
+            diff = [
+                {
+                    "location": str(stat.traceback[0]),
+                    "size_diff_bytes": stat.size_diff,
+                    "count_diff": stat.count_diff,
+                    "size_bytes": stat.size,
+                }
+                for stat in snapshot.compare_to(_last_snapshot, "lineno")[:limit]
+            ]
+        _last_snapshot = snapshot
+        return {
+            "tracing": True,
+            "started": False,
+            "traced_current_bytes": current,
+            "traced_peak_bytes": peak,
+            "top": top,
+            "diff_since_last": diff,
+        }
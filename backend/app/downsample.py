@@ -0,0 +1,250 @@
+"""
+Downsampling for chart-ready history: largest-triangle-three-buckets (LTTB)
+and min/max/mean buckets.
+
+ChartSeries keeps recent samples as numpy columns. A query for `points`
+over `window` seconds splits time into buckets of width window/points,
+aligned to multiples of that width. Samples arrive in time order, so once a
+newer sample exists, an older bucket never changes. Its result is cached per
+resolution, and a request only computes the buckets that appeared or are
+still open since the previous one.
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+FIELDS = ["raw", "grams", "mass_kg"]
+MODES = ["lttb", "minmax"]
+
+# Persisted layout: 20 bytes per sample (float32 is ample for the readings, not for epoch times)
+RECORD_DTYPE = np.dtype([("read_at", "<f8")] + [(field, "<f4") for field in FIELDS])
+
+
+def triangle_areas(ax: float, ay: float, bx: np.ndarray, by: np.ndarray, cx: float, cy: float) -> np.ndarray:
+    """Twice the area of each triangle (a, b[i], c), for every candidate b at once."""
+    return np.abs((ax - cx) * (by - ay) - (ax - bx) * (cy - ay))
+
+
+def bucket_start(t: np.ndarray, bucket: int, width: float) -> int:
+    """Index of the first sample in `bucket` or later, as assigned by floor(t / width).
+
+    since * width can round to the other side of a sample sitting on a
+    bucket edge, so the searchsorted guess is corrected against the ids.
+    """
+    i = int(np.searchsorted(t, bucket * width))
+    while i > 0 and math.floor(t[i - 1] / width) >= bucket:
+        i -= 1
+    while i < len(t) and math.floor(t[i] / width) < bucket:
+        i += 1
+    return i
+
+
+def bucket_stats(t: np.ndarray, v: np.ndarray, width: float):
+    """Group time-ordered samples into aligned buckets.
+
+    Returns (bucket ids, start offsets, counts, min, max, mean, mean t) for the
+    non-empty buckets, computed with reduceat rather than a Python loop.
+    """
+    ids = np.floor(t / width).astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    counts = np.diff(np.r_[starts, len(t)])
+    means = np.add.reduceat(v, starts) / counts
+    t_means = np.add.reduceat(t, starts) / counts
+    return ids[starts], starts, counts, np.minimum.reduceat(v, starts), np.maximum.reduceat(v, starts), means, t_means
+
+
+class ChartSeries:
+    """Bounded columnar store of (read_at, raw, grams, mass_kg) with cached downsampled views."""
+
+    def __init__(self, capacity: int = 36000, max_cached: int = 16):
+        self.capacity = capacity
+        self.max_cached = max_cached
+        self._lock = threading.Lock()
+        # Twice the capacity, compacted when full, so appends are amortized O(1)
+        self._t = np.empty(2 * capacity)
+        self._v = np.empty((2 * capacity, len(FIELDS)))
+        self._start = 0
+        self._end = 0
+        self._cache: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def append(self, data: dict, trace: Optional[dict] = None):
+        """Add one sample; has the reader listener signature so it can be registered directly."""
+        t = data.get("read_at")
+        if t is None:
+            return
+        with self._lock:
+            if self._end > self._start and t < self._t[self._end - 1]:
+                return  # Buckets rely on time order; a reading from the past is dropped
+            if self._end == len(self._t):
+                keep = self.capacity - 1
+                self._t[:keep] = self._t[self._end - keep:self._end]
+                self._v[:keep] = self._v[self._end - keep:self._end]
+                self._start, self._end = 0, keep
+            self._t[self._end] = t
+            self._v[self._end] = [data.get(field, 0.0) for field in FIELDS]
+            self._end += 1
+            if self._end - self._start > self.capacity:
+                self._start += 1
+
+    def snapshot(self) -> np.ndarray:
+        """Contents as a compact record array (RECORD_DTYPE)."""
+        with self._lock:
+            records = np.empty(self._end - self._start, dtype=RECORD_DTYPE)
+            records["read_at"] = self._t[self._start:self._end]
+            for i, field in enumerate(FIELDS):
+                records[field] = self._v[self._start:self._end, i]
+        return records
+
+    def load(self, records: np.ndarray):
+        """Replace the contents with records produced by snapshot()."""
+        records = records[-self.capacity:]
+        with self._lock:
+            self._start, self._end = 0, len(records)
+            self._t[:len(records)] = records["read_at"]
+            for i, field in enumerate(FIELDS):
+                self._v[:len(records), i] = records[field]
+            self._cache.clear()
+
+    def save(self, path: str, sync: bool = True):
+        """Atomically write the contents as a .npy file.
+
+        With sync=False the data is left to the page cache, which is enough
+        for a clean restart and keeps shutdown fast.
+        """
+        records = self.snapshot()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, records, allow_pickle=False)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def restore(self, path: str) -> bool:
+        """Load a file written by save(); a missing or unreadable file is ignored."""
+        try:
+            records = np.load(path, allow_pickle=False)
+        except (OSError, ValueError):
+            return False
+        if records.dtype != RECORD_DTYPE or records.ndim != 1:
+            return False
+        self.load(records)
+        return True
+
+    def _entry(self, key) -> dict:
+        entry = self._cache.get(key)
+        if entry is None:
+            # rows hold finished buckets from `start` up to `done`, in order
+            entry = {"start": None, "done": None, "rows": OrderedDict()}
+            self._cache[key] = entry
+            if len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(key)
+        return entry
+
+    def query(self, window: float, points: int, mode: str = "lttb", field: str = "mass_kg", now: Optional[float] = None) -> dict:
+        """At most `points` points covering the last `window` seconds."""
+        if mode not in MODES:
+            raise ValueError(f"Unknown downsampling mode: {mode!r}")
+        column = FIELDS.index(field)
+        width = window / points
+        now = time.time() if now is None else now
+        first = math.floor((now - window) / width) + 1
+        with self._lock:
+            t_all = self._t[self._start:self._end]
+            entry = self._entry((field, mode, width))
+            rows = entry["rows"]
+            if len(t_all):
+                # Windows sharing a bucket width share an entry, so only drop
+                # buckets whose samples have left the store
+                oldest = math.floor(t_all[0] / width)
+                while rows and next(iter(rows)) < oldest:
+                    rows.popitem(last=False)
+                wanted = max(first, oldest)
+                if entry["start"] is None or wanted < entry["start"]:
+                    # This window reaches further back than the cache covers: rebuild it
+                    rows.clear()
+                    entry["start"], entry["done"] = wanted, None
+                done = entry["done"]
+                since = entry["start"] if done is None else done + 1
+                lo = bucket_start(t_all, since, width)
+                t, v = t_all[lo:], self._v[self._start + lo:self._end, column]
+                if mode == "lttb":
+                    tail = self._lttb_tail(entry, first, t, v, width)
+                else:
+                    tail = self._minmax_tail(entry, first, t, v, width)
+            else:
+                tail = []
+            cached = []
+            for bucket, row in reversed(rows.items()):
+                if bucket < first:
+                    break
+                cached.append(row)
+            cached.reverse()
+            result = cached + tail
+        result = result[-points:]
+        series = {"window": window, "points": len(result), "mode": mode, "field": field}
+        if mode == "lttb":
+            series["t"] = [row[0] for row in result]
+            series["value"] = [row[1] for row in result]
+        else:
+            for i, name in enumerate(("t", "min", "max", "mean", "count")):
+                series[name] = [row[i] for row in result]
+        return series
+
+    def _minmax_tail(self, entry: dict, first: int, t, v, width: float) -> list:
+        """Compute buckets newer than the cached ones; completed buckets join the cache."""
+        if not len(t):
+            return []
+        ids, _, counts, mins, maxs, means, _ = bucket_stats(t, v, width)
+        tail = []
+        for k, bucket in enumerate(ids.tolist()):
+            row = (bucket * width, float(mins[k]), float(maxs[k]), float(means[k]), int(counts[k]))
+            if k < len(ids) - 1:  # A newer bucket exists, so this one is complete
+                entry["rows"][bucket] = row
+                entry["done"] = bucket
+            elif bucket >= first:
+                tail.append(row)
+        return tail
+
+    def _lttb_tail(self, entry: dict, first: int, t, v, width: float) -> list:
+        """Extend the cached LTTB selection; only the last two buckets stay provisional.
+
+        A bucket's choice depends on the previous choice and on the next
+        bucket's mean, so it is final once the next bucket is complete. The
+        newest sample is always kept, like LTTB's fixed last point.
+        """
+        if not len(t):
+            return []
+        ids, starts, counts, _, _, means, t_means = bucket_stats(t, v, width)
+        rows = entry["rows"]
+        prev = next(reversed(rows.values())) if rows else None
+        tail = []
+        for k, bucket in enumerate(ids.tolist()):
+            lo, hi = starts[k], starts[k] + counts[k]
+            if k == len(ids) - 1:
+                i = hi - 1
+            elif prev is None:
+                i = lo  # Start of the series: keep the first point, as LTTB does
+            else:
+                area = triangle_areas(prev[0], prev[1], t[lo:hi], v[lo:hi], t_means[k + 1], means[k + 1])
+                i = lo + int(np.argmax(area))
+            prev = (float(t[i]), float(v[i]))
+            if k < len(ids) - 2:
+                rows[bucket] = prev
+                entry["done"] = bucket
+            elif bucket >= first:
+                tail.append(prev)
+        return tail
@@ -0,0 +1,108 @@
+"""
+Frame encodings for the /ws stream: JSON (default), MessagePack and packed float32.
+
+Clients pick an encoding with ?encoding=<name> or by offering the matching
+WebSocket subprotocol (weight.json, weight.msgpack, weight.f32). Frames are
+encoded once per sample and encoding and shared by every client using it.
+"""
+import json
+import struct
+import threading
+from typing import Iterable, Optional, Tuple, Union
+
+try:
+    import msgpack
+except ImportError:  # Optional: MessagePack is only offered when installed
+    msgpack = None
+
+BODIES = ["Sun", "Mercury", "Earth", "Moon", "Uranus", "Pluto", "Pulsar"]
+
+# Packed layout: little-endian uint32 sequence ID, then one float32 per field
+F32_FIELDS = ["seq", "raw", "grams", "mass_kg"] + [f"weights_newton.{body}" for body in BODIES]
+F32_FORMAT = "<I" + "f" * (len(F32_FIELDS) - 1)
+_f32_struct = struct.Struct(F32_FORMAT)
+
+SUBPROTOCOL_PREFIX = "weight."
+
+
+def available_encodings() -> list:
+    encodings = ["json", "f32"]
+    if msgpack is not None:
+        encodings.append("msgpack")
+    return encodings
+
+
+def negotiate(requested: Optional[str], offered_subprotocols: Iterable[str]) -> Tuple[str, Optional[str]]:
+    """Choose an encoding and the subprotocol to confirm in the handshake.
+
+    An explicit ?encoding= query parameter wins; otherwise the first offered
+    weight.* subprotocol we support is used. Unknown requests fall back to JSON.
+    """
+    supported = available_encodings()
+    offered = list(offered_subprotocols or [])
+    if requested:
+        encoding = requested.lower() if requested.lower() in supported else "json"
+        subprotocol = SUBPROTOCOL_PREFIX + encoding
+        return encoding, subprotocol if subprotocol in offered else None
+    for subprotocol in offered:
+        if subprotocol.startswith(SUBPROTOCOL_PREFIX) and subprotocol[len(SUBPROTOCOL_PREFIX):] in supported:
+            return subprotocol[len(SUBPROTOCOL_PREFIX):], subprotocol
+    return "json", None
+
+
+def f32_schema_header() -> str:
+    """Text frame sent once before the first f32 frame, naming every packed field."""
+    return json.dumps({
+        "type": "schema",
+        "encoding": "f32",
+        "format": F32_FORMAT,
+        "byte_order": "little",
+        "fields": F32_FIELDS,
+        "bodies": BODIES,
+    })
+
+
+def encode(data: dict, encoding: str) -> Union[str, bytes]:
+    """Encode a sample; JSON yields a text frame, the binary encodings yield bytes."""
+    if encoding == "f32":
+        weights = data["weights_newton"]
+        return _f32_struct.pack(
+            data.get("seq", 0) & 0xFFFFFFFF,
+            data["raw"], data["grams"], data["mass_kg"],
+            *(weights[b] for b in BODIES),
+        )
+    if encoding == "msgpack":
+        return msgpack.packb(data, use_bin_type=True)
+    return json.dumps(data)
+
+
+def decode_f32(frame: bytes) -> dict:
+    """Inverse of the f32 encoding (reference for clients and tests)."""
+    values = _f32_struct.unpack(frame)
+    return {
+        "seq": values[0],
+        "raw": values[1],
+        "grams": values[2],
+        "mass_kg": values[3],
+        "weights_newton": dict(zip(BODIES, values[4:])),
+    }
+
+
+class FrameCache:
+    """Keeps the most recent encoded frame per encoding, keyed by sample sequence ID."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._frames = {}
+        self.encodes = 0
+
+    def get(self, seq, data: dict, encoding: str) -> Union[str, bytes]:
+        with self._lock:
+            cached = self._frames.get(encoding)
+            if cached is not None and cached[0] == seq:
+                return cached[1]
+        frame = encode(data, encoding)
+        with self._lock:
+            self._frames[encoding] = (seq, frame)
+            self.encodes += 1
+        return frame
@@ -0,0 +1,384 @@
+"""
+Forwarder: Batches readings and pushes them to an upstream collector (HTTP or MQTT).
+"""
+import gzip
+import http.client
+import json
+import os
+import queue
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import List, Optional
+from urllib.parse import urlsplit
+
+
+class ForwardError(Exception):
+    """Raised when a batch could not be delivered to the upstream collector."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after  # Seconds the collector asked us to wait, if it said
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Read a Retry-After header given as delay-seconds or an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class BatchRejected(ForwardError):
+    """Raised when the collector refuses a batch outright (HTTP 4xx); retrying cannot help."""
+
+
+# 4xx statuses that mean "not now" rather than "never": spool and back off
+BACKOFF_STATUSES = (408, 429)
+
+
+class HttpTransport:
+    """POSTs compressed batches over a single keep-alive HTTP(S) connection."""
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        parts = urlsplit(url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.path = parts.path or "/"
+        if parts.query:
+            self.path += "?" + parts.query
+        self.timeout = timeout
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            conn_cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+            self._conn = conn_cls(self.host, self.port, timeout=self.timeout)
+        return self._conn
+
+    def send(self, payload: bytes):
+        """Send one gzip-compressed NDJSON chunk, reusing the pooled connection."""
+        headers = {
+            "Content-Type": "application/x-ndjson",
+            "Content-Encoding": "gzip",
+            "Connection": "keep-alive",
+        }
+        # One retry covers the common case of the server having closed an idle keep-alive socket
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request("POST", self.path, body=payload, headers=headers)
+                response = conn.getresponse()
+                response.read()  # Drain the body so the connection can be reused
+            except (OSError, http.client.HTTPException) as e:
+                self.close()
+                if attempt == 1:
+                    raise ForwardError(f"HTTP upstream unreachable: {e}") from e
+                continue
+            if response.will_close:
+                self.close()
+            if response.status in BACKOFF_STATUSES:
+                raise ForwardError(
+                    f"HTTP upstream asked to back off with status {response.status}",
+                    retry_after=parse_retry_after(response.getheader("Retry-After")),
+                )
+            if 400 <= response.status < 500:
+                raise BatchRejected(f"HTTP upstream rejected batch with status {response.status}")
+            if not 200 <= response.status < 300:
+                raise ForwardError(f"HTTP upstream rejected batch with status {response.status}")
+            return
+
+    def close(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+
+class MqttTransport:
+    """Publishes compressed batches to an MQTT topic over a persistent session."""
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        try:
+            import paho.mqtt.client as mqtt
+        except ImportError as e:
+            raise RuntimeError("MQTT forwarding requires the 'paho-mqtt' package") from e
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 1883
+        self.topic = parts.path.lstrip("/") or "weight-exhibit/readings"
+        self.timeout = timeout
+        self._client = mqtt.Client()
+        if parts.username:
+            self._client.username_pw_set(parts.username, parts.password)
+        self._connected = False
+
+    def _ensure_connected(self):
+        if not self._connected:
+            self._client.connect(self.host, self.port, keepalive=60)
+            self._client.loop_start()
+            self._connected = True
+
+    def send(self, payload: bytes):
+        """Publish one chunk with QoS 1 and wait for the broker to acknowledge it."""
+        try:
+            self._ensure_connected()
+            info = self._client.publish(self.topic, payload, qos=1)
+            info.wait_for_publish(timeout=self.timeout)
+            if not info.is_published():
+                raise ForwardError("MQTT broker did not acknowledge batch in time")
+        except ForwardError:
+            self.close()
+            raise
+        except Exception as e:
+            self.close()
+            raise ForwardError(f"MQTT upstream unreachable: {e}") from e
+
+    def close(self):
+        if self._connected:
+            try:
+                self._client.loop_stop()
+                self._client.disconnect()
+            except Exception:
+                pass
+            self._connected = False
+
+
+def make_transport(url: str, timeout: float = 5.0):
+    """Pick a transport implementation from the URL scheme."""
+    scheme = urlsplit(url).scheme
+    if scheme in ("http", "https"):
+        return HttpTransport(url, timeout=timeout)
+    if scheme == "mqtt":
+        return MqttTransport(url, timeout=timeout)
+    raise ValueError(f"Unsupported forwarder URL scheme: {scheme!r}")
+
+
+class Forwarder:
+    """Collects samples from the reader, batches them and ships them upstream.
+
+    Samples are accepted without blocking; if the in-memory queue is full they
+    are dropped and counted. Batches that cannot be delivered are spooled to
+    disk and drained oldest-first once the upstream is reachable again, with
+    exponential backoff between failed attempts.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        batch_size: int = 50,
+        flush_interval: float = 5.0,
+        spool_dir: Optional[str] = None,
+        max_queue: int = 1000,
+        max_spool_files: int = 1000,
+        max_backoff: float = 60.0,
+        transport=None,
+    ):
+        self.url = url
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_dir = spool_dir
+        self.max_spool_files = max_spool_files
+        self.max_backoff = max_backoff
+        self._transport = transport or make_transport(url)
+        self._queue: "queue.Queue[dict]" = queue.Queue(maxsize=max_queue)
+        self._stop_event = threading.Event()
+        self._backoff = 0.0
+        self._retry_at = 0.0
+        self._stats = {
+            "sent_batches": 0,
+            "sent_samples": 0,
+            "spooled_batches": 0,
+            "rejected_batches": 0,
+            "dropped_samples": 0,
+            "failures": 0,
+        }
+        # Spool depth is tracked here so stats() and the send path never list the directory
+        self._spool_lock = threading.Lock()
+        self._spooled = 0
+        if self.spool_dir:
+            os.makedirs(self.spool_dir, exist_ok=True)
+            self._spooled = len(self._spool_files())
+        self._thread = threading.Thread(target=self._run, name="Forwarder", daemon=True)
+        self._thread.start()
+
+    def submit(self, data: dict, trace: Optional[dict] = None):
+        """Queue a sample for forwarding. Never blocks the caller.
+
+        Usable directly as a SerialReader listener; the trace is not forwarded.
+        """
+        sample = dict(data)
+        sample.setdefault("received_at", time.time())
+        try:
+            self._queue.put_nowait(sample)
+        except queue.Full:
+            self._stats["dropped_samples"] += 1
+
+    def stats(self) -> dict:
+        """Return delivery counters plus the current queue and spool depth."""
+        result = dict(self._stats)
+        result["queued_samples"] = self._queue.qsize()
+        result["spooled_pending"] = self._spooled
+        return result
+
+    @staticmethod
+    def encode_batch(samples: List[dict]) -> bytes:
+        """Encode samples as gzip-compressed newline-delimited JSON."""
+        lines = "\n".join(json.dumps(s, separators=(",", ":")) for s in samples) + "\n"
+        return gzip.compress(lines.encode("utf-8"))
+
+    def _collect_batch(self) -> List[dict]:
+        """Wait up to flush_interval for a full batch, returning whatever arrived."""
+        batch: List[dict] = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop_event.is_set():
+                break
+            try:
+                batch.append(self._queue.get(timeout=min(remaining, 0.1)))
+            except queue.Empty:
+                continue
+        return batch
+
+    def _drain_queue(self) -> List[dict]:
+        batch: List[dict] = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                return batch
+
+    def _spool_files(self) -> List[str]:
+        if not self.spool_dir:
+            return []
+        try:
+            names = sorted(n for n in os.listdir(self.spool_dir) if n.endswith(".ndjson.gz"))
+        except OSError:
+            return []
+        return [os.path.join(self.spool_dir, n) for n in names]
+
+    @staticmethod
+    def _spooled_count(path: str) -> int:
+        """Samples in a spool file, from its name ("<time_ns>-<count>.ndjson.gz"); 0 if unknown."""
+        _, _, count = os.path.basename(path)[: -len(".ndjson.gz")].partition("-")
+        return int(count) if count.isdigit() else 0
+
+    def _spool(self, payload: bytes, count: int):
+        """Persist an undeliverable chunk, evicting the oldest when the spool is full."""
+        if not self.spool_dir:
+            self._stats["dropped_samples"] += count
+            return
+        with self._spool_lock:
+            if self._spooled >= self.max_spool_files:
+                files = self._spool_files()
+                for old in files[: max(0, len(files) - self.max_spool_files + 1)]:
+                    try:
+                        os.remove(old)
+                    except OSError:
+                        continue
+                    self._stats["dropped_samples"] += self._spooled_count(old)
+                self._spooled = len(self._spool_files())
+            path = os.path.join(self.spool_dir, f"{time.time_ns():020d}-{count}.ndjson.gz")
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(payload)
+            os.replace(tmp, path)
+            self._spooled += 1
+        self._stats["spooled_batches"] += 1
+
+    def _try_send(self, payload: bytes, count: int = 0) -> bool:
+        """Send one chunk; True once it needs no retry (delivered, or rejected and dropped).
+
+        `count` is the number of samples in the chunk, for the counters.
+        """
+        if time.monotonic() < self._retry_at:
+            return False
+        try:
+            self._transport.send(payload)
+        except BatchRejected as e:
+            # A poison batch must not block everything queued behind it
+            self._stats["rejected_batches"] += 1
+            self._stats["dropped_samples"] += count
+            print(f"Forwarder: {e} (batch dropped)")
+            return True
+        except ForwardError as e:
+            self._stats["failures"] += 1
+            self._backoff = min(self.max_backoff, self._backoff * 2 if self._backoff else 1.0)
+            # Honor the collector's Retry-After, within the usual backoff ceiling
+            delay = max(self._backoff, min(e.retry_after or 0.0, self.max_backoff))
+            self._retry_at = time.monotonic() + delay
+            print(f"Forwarder: {e} (retrying in {delay:.0f}s)")
+            return False
+        self._backoff = 0.0
+        self._retry_at = 0.0
+        self._stats["sent_batches"] += 1
+        self._stats["sent_samples"] += count
+        return True
+
+    def _drain_spool(self, limit: int):
+        """Replay up to `limit` spooled chunks, stopping at the first failure."""
+        if not self._spooled:
+            return
+        files = self._spool_files()
+        with self._spool_lock:
+            self._spooled = len(files)  # Resync in case files were removed behind our back
+        for path in files[:limit]:
+            try:
+                with open(path, "rb") as f:
+                    payload = f.read()
+            except OSError:
+                continue
+            if not self._try_send(payload, self._spooled_count(path)):
+                return
+            os.remove(path)
+            with self._spool_lock:
+                self._spooled -= 1
+
+    def _ship(self, batch: List[dict]):
+        payload = self.encode_batch(batch)
+        # Spooled data is older, so it goes first; never send new data ahead of a backlog
+        if self._spooled:
+            self._spool(payload, len(batch))
+        elif not self._try_send(payload, len(batch)):
+            self._spool(payload, len(batch))
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            batch = self._collect_batch()
+            if batch:
+                self._ship(batch)
+            # Drain a bounded number of spooled chunks per cycle so live
+            # batching keeps pace with the reader while the backlog clears
+            self._drain_spool(limit=4)
+        batch = self._drain_queue()
+        if batch:
+            # Spool rather than send so shutdown never waits on the network;
+            # the next start drains the spool first
+            if self.spool_dir:
+                self._spool(self.encode_batch(batch), len(batch))
+            else:
+                self._ship(batch)
+
+    def stop(self, timeout: float = 0.5):
+        """Spool pending samples and stop the worker."""
+        self._stop_event.set()
+        self._retry_at = 0.0
+        if self._thread.is_alive():
+            self._thread.join(timeout=timeout)
+        if self._thread.is_alive() and self.spool_dir:
+            # The worker is stuck in a send and would not reach its own tail
+            # spool before the process exits; save the queued samples here
+            batch = self._drain_queue()
+            if batch:
+                self._spool(self.encode_batch(batch), len(batch))
+        self._transport.close()
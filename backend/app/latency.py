@@ -0,0 +1,81 @@
+"""
+LatencyTracker: Rolling per-stage latency distributions for the sample pipeline.
+
+Stages, all measured on the server's monotonic clock unless noted:
+    read_to_validate     line read from serial -> structure validated
+    validate_to_publish  reader thread -> event loop hand-off
+    publish_to_send      event loop has the sample -> first send to a client
+    read_to_send         end-to-end server time for a sample
+    client_rtt           send -> client echo received back
+    client_age           sample read -> client receipt (wall clock, cross-host)
+"""
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+STAGES = (
+    "read_to_validate",
+    "validate_to_publish",
+    "publish_to_send",
+    "read_to_send",
+    "client_rtt",
+    "client_age",
+)
+
+
+def _summarize(values) -> dict:
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+    n = len(ordered)
+
+    def pct(p):
+        return ordered[min(n - 1, int(n * p / 100.0))] * 1000.0
+
+    return {
+        "count": n,
+        "mean_ms": sum(ordered) / n * 1000.0,
+        "p50_ms": pct(50),
+        "p95_ms": pct(95),
+        "p99_ms": pct(99),
+        "max_ms": ordered[-1] * 1000.0,
+    }
+
+
+class LatencyTracker:
+    """Keeps the last `window` observations per stage in fixed-size rings."""
+
+    def __init__(self, window: int = 2048):
+        self.window = window
+        self._lock = threading.Lock()
+        self._stages: Dict[str, deque] = {stage: deque(maxlen=window) for stage in STAGES}
+
+    def record(self, stage: str, seconds: Optional[float]):
+        if seconds is None or seconds < 0:
+            return
+        with self._lock:
+            self._stages[stage].append(seconds)
+
+    def record_publish(self, trace: dict):
+        """Record the reader-side stages once a sample reaches the event loop."""
+        t_read, t_validate, t_publish = trace.get("t_read"), trace.get("t_validate"), trace.get("t_publish")
+        if t_read is not None and t_validate is not None:
+            self.record("read_to_validate", t_validate - t_read)
+        if t_validate is not None and t_publish is not None:
+            self.record("validate_to_publish", t_publish - t_validate)
+
+    def record_send(self, trace: dict, t_send: float):
+        if trace.get("t_publish") is not None:
+            self.record("publish_to_send", t_send - trace["t_publish"])
+        if trace.get("t_read") is not None:
+            self.record("read_to_send", t_send - trace["t_read"])
+
+    def summary(self) -> dict:
+        with self._lock:
+            snapshot = {stage: list(values) for stage, values in self._stages.items()}
+        return {stage: _summarize(values) for stage, values in snapshot.items()}
+
+    def reset(self):
+        with self._lock:
+            for values in self._stages.values():
+                values.clear()
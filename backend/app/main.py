@@ -1,26 +1,57 @@
 from . import config
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse
 from .serial_reader import SerialReader
+from .relay import RelayReader
+from .forwarder import Forwarder
+from . import diagnostics
+from . import downsample
+from .downsample import ChartSeries
+from . import encoding as encodings
+from .encoding import FrameCache
+from .sample_hub import SampleHub
+from .state_store import StateStore
+from .watchdog import FreshnessWatchdog
 from .models import ArduinoWeightData
 from .websocket_manager import WebSocketManager
 import asyncio
 import json
+import os
+import time
+import uuid
 import signal
 import threading
 import atexit
+from collections import OrderedDict
 from datetime import datetime
 from contextlib import asynccontextmanager
+from typing import Optional
 
-# Global variable to hold the serial reader
+# Distinguishes ETags issued by this process from those of earlier runs
+BOOT_ID = uuid.uuid4().hex[:8]
+
+# Global variable to hold the sample source (a SerialReader, or a RelayReader in relay mode)
 serial_reader = None
 
+# Optional upstream forwarder (only created when FORWARD_URL is configured)
+forwarder = None
+
+# Persists the last sample and calibration across restarts (None when STATE_FILE is empty)
+state_store = None
+
+# Restarts the reader when samples go stale (None when WATCHDOG_SLO is 0)
+watchdog = None
+
 # Flag to track if cleanup has been performed
 cleanup_performed = False
 cleanup_lock = threading.Lock()
 
+# The atexit fallback must only be registered once per process
+atexit_registered = False
+
 def cleanup_resources():
     """Cleanup function to ensure serial port is closed properly."""
-    global serial_reader, cleanup_performed
+    global serial_reader, forwarder, cleanup_performed
     
     with cleanup_lock:
         if cleanup_performed:
@@ -37,8 +68,82 @@ def cleanup_resources():
         except Exception as e:
             print(f"Error stopping serial reader: {e}")
     
+    # Hand the last sample, calibration and chart history over to the next process
+    save_state()
+    save_chart_history(sync=False)
+    
+    # Flush (or spool) whatever the forwarder still holds
+    if forwarder:
+        try:
+            forwarder.stop()
+            print("Forwarder stopped successfully.")
+        except Exception as e:
+            print(f"Error stopping forwarder: {e}")
+    
     print("Cleanup complete.")
 
+def save_state():
+    """Persist the latest sample, its sequence ID and the calibration, if enabled."""
+    if state_store is None:
+        return
+    try:
+        seq, data, _ = sample_hub.latest()
+        if data is None and serial_reader is not None:
+            # No sample yet this run: keep the sequence ID the reader continued from
+            seq = max(seq, serial_reader.seq)
+        calibration = serial_reader.calibration if serial_reader else None
+        state_store.save(seq, data, calibration)
+    except Exception as e:
+        print(f"Error saving state: {e}")
+
+def chart_history_path() -> Optional[str]:
+    """Chart history is kept in binary form next to the state file."""
+    if state_store is None:
+        return None
+    return os.path.join(os.path.dirname(state_store.path), "chart-history.npy")
+
+def save_chart_history(sync: bool = True):
+    """Persist the chart history, if enabled."""
+    path = chart_history_path()
+    if path is None:
+        return
+    try:
+        chart_series.save(path, sync=sync)
+    except Exception as e:
+        print(f"Error saving chart history: {e}")
+
+def restore_state() -> dict:
+    """Load persisted state and republish the last sample.
+
+    Returns the state so the caller can continue its sequence IDs and
+    calibration. Without a fresh sample the hub is left alone: it must never
+    report a sequence ID it has no data for.
+    """
+    if state_store is None:
+        return {"seq": 0, "sample": None, "calibration": None}
+    state = state_store.load()
+    chart_series.restore(chart_history_path())
+    if state["sample"] is not None and state["seq"] > sample_hub.seq:
+        sample_hub.publish(dict(state["sample"], seq=state["seq"]))
+        print(f"Restored sample {state['seq']} from {state_store.path}")
+    return state
+
+async def persist_state_periodically():
+    """Save state whenever it changed, so a crash loses at most one interval.
+
+    The chart history is much larger, so it is written less often.
+    """
+    saved_seq = sample_hub.seq
+    history_saved_at = time.monotonic()
+    while True:
+        await asyncio.sleep(config.STATE_SAVE_INTERVAL)
+        if sample_hub.seq != saved_seq:
+            saved_seq = sample_hub.seq
+            await asyncio.to_thread(save_state)
+            if time.monotonic() - history_saved_at >= config.CHART_SAVE_INTERVAL:
+                history_saved_at = time.monotonic()
+                await asyncio.to_thread(save_chart_history)
+
 def signal_handler(signum, frame):
     """Handle interrupt signals to ensure proper cleanup."""
     print(f"\nReceived signal {signum}, performing cleanup...")
@@ -50,17 +155,71 @@ def signal_handler(signum, frame):
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup: Initialize the serial reader
-    global serial_reader
+    global serial_reader, forwarder, state_store, watchdog, cleanup_performed, atexit_registered
     
-    # Register signal handlers for graceful shutdown
-    signal.signal(signal.SIGINT, signal_handler)
-    if hasattr(signal, 'SIGTERM'):
-        signal.signal(signal.SIGTERM, signal_handler)
+    # Register signal handlers for graceful shutdown (only possible from the main thread)
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGINT, signal_handler)
+        if hasattr(signal, 'SIGTERM'):
+            signal.signal(signal.SIGTERM, signal_handler)
     
     # Register atexit handler as a final fallback
-    atexit.register(cleanup_resources)
+    if not atexit_registered:
+        atexit.register(cleanup_resources)
+        atexit_registered = True
+    
+    # A new startup gets a fresh cleanup pass at its own shutdown
+    with cleanup_lock:
+        cleanup_performed = False
+    forwarder = None
+    
+    # Pick up where the previous process left off: clients see its last
+    # reading immediately and sequence IDs keep increasing
+    state_store = StateStore(config.STATE_FILE, max_sample_age=config.STATE_MAX_SAMPLE_AGE) if config.STATE_FILE else None
+    restored = restore_state()
+    start_seq = max(sample_hub.seq, restored["seq"])
+    calibration = restored["calibration"]
     
-    serial_reader = SerialReader(port=config.SERIAL_PORT, baudrate=config.SERIAL_BAUDRATE)
+    if config.RELAY_UPSTREAM:
+        serial_reader = RelayReader(
+            config.RELAY_UPSTREAM,
+            start_seq=start_seq,
+            calibration=calibration,
+            poll_timeout=config.RELAY_POLL_TIMEOUT,
+        )
+        print(f"Relaying samples from {config.RELAY_UPSTREAM}")
+    else:
+        serial_reader = SerialReader(
+            port=config.SERIAL_PORT,
+            baudrate=config.SERIAL_BAUDRATE,
+            start_seq=start_seq,
+            calibration=calibration,
+        )
+    serial_reader.add_listener(sample_hub.threadsafe_publisher(asyncio.get_running_loop()))
+    serial_reader.add_listener(chart_series.append)
+    persist_task = asyncio.create_task(persist_state_periodically()) if state_store else None
+    
+    watchdog = FreshnessWatchdog(
+        sample_hub,
+        slo=config.WATCHDOG_SLO,
+        check_interval=config.WATCHDOG_INTERVAL,
+        max_backoff=config.WATCHDOG_MAX_BACKOFF,
+    ) if config.WATCHDOG_SLO > 0 else None
+    watchdog_task = asyncio.create_task(watchdog.run(lambda: serial_reader)) if watchdog else None
+    
+    if config.FORWARD_URL:
+        try:
+            forwarder = Forwarder(
+                config.FORWARD_URL,
+                batch_size=config.FORWARD_BATCH_SIZE,
+                flush_interval=config.FORWARD_FLUSH_INTERVAL,
+                spool_dir=config.FORWARD_SPOOL_DIR,
+                max_spool_files=config.FORWARD_MAX_SPOOL_FILES,
+            )
+            serial_reader.add_listener(forwarder.submit)
+            print(f"Forwarding readings to {config.FORWARD_URL}")
+        except Exception as e:
+            print(f"Error starting forwarder: {e}")
     
     try:
         yield
@@ -68,6 +227,11 @@ async def lifespan(app: FastAPI):
         # Shutdown: Clean up resources
         print("Shutting down application...")
         
+        if persist_task:
+            persist_task.cancel()
+        if watchdog_task:
+            watchdog_task.cancel()
+        
         try:
             # Close all WebSocket connections
             await websocket_manager.close_all()
@@ -81,23 +245,34 @@ async def lifespan(app: FastAPI):
 
 app = FastAPI(lifespan=lifespan)
 websocket_manager = WebSocketManager()
+frame_cache = FrameCache()
+chart_series = ChartSeries(capacity=config.CHART_HISTORY_SIZE)
+sample_hub = SampleHub(history_size=config.HISTORY_SIZE)
 
 @app.get("/health")
 async def health():
-    """Health check endpoint for monitoring and load balancers."""
-    serial_connected = False
-    if serial_reader:
-        try:
-            serial_connected = hasattr(serial_reader, '_serial') and serial_reader._serial and serial_reader._serial.is_open
-        except Exception:
-            serial_connected = False
+    """Health check endpoint for monitoring and load balancers.
+
+    Only reads state the reader and watchdog already keep, so it never blocks
+    on the serial port.
+    """
+    serial_connected = bool(getattr(serial_reader, "connected", False))
     
     return {
         "status": "healthy", 
         "timestamp": datetime.now().isoformat(),
-        "serial_connected": serial_connected
+        "serial_connected": serial_connected,
+        "reader_alive": bool(getattr(serial_reader, "alive", serial_connected)),
+        "freshness": watchdog.status() if watchdog else None,
+        "forwarder": forwarder.stats() if forwarder else None,
+        "relay": serial_reader.stats if isinstance(serial_reader, RelayReader) else None,
     }
 
+@app.get("/api/calibration")
+def get_calibration():
+    """Last tare offset reported by the firmware (persisted across restarts)."""
+    return {"calibration": serial_reader.calibration if serial_reader else None}
+
 @app.get("/debug/raw-data")
 def get_raw_data():
     """Debug endpoint to see raw data from serial port"""
@@ -117,104 +292,200 @@ def get_raw_data():
         "is_none": data is None
     }
 
-@app.get("/api/weight", response_model=ArduinoWeightData)
-def get_latest_weight():
+def _require_debug_endpoints():
+    """Hide the profiling endpoints unless DEBUG_ENDPOINTS is enabled."""
+    if not config.DEBUG_ENDPOINTS:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+@app.get("/debug/profile", response_class=PlainTextResponse)
+async def debug_profile(seconds: float = Query(5.0, gt=0), interval: float = Query(0.01, ge=0.001, le=1.0)):
+    """Sample all thread stacks (reader thread and event loop included) in collapsed-stack format."""
+    _require_debug_endpoints()
+    seconds = min(seconds, config.DEBUG_PROFILE_MAX_SECONDS)
+    try:
+        # Sample from a worker thread so the event loop itself shows up in the stacks
+        counts = await asyncio.to_thread(diagnostics.sample_stacks, seconds, interval)
+    except diagnostics.ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return diagnostics.format_collapsed(counts)
+
+@app.get("/debug/memory")
+def debug_memory(limit: int = Query(20, ge=1, le=200), stop: bool = False):
+    """tracemalloc top allocators and diff since the previous call (first call starts tracing)."""
+    _require_debug_endpoints()
+    return diagnostics.memory_report(limit=limit, stop=stop)
+
+def default_weight_data() -> dict:
+    """All-zero payload served while no serial data is available."""
+    return {
+        "raw": 0.0,
+        "grams": 0.0,
+        "mass_kg": 0.0,
+        "weights_newton": {
+            "Sun": 0.0,
+            "Mercury": 0.0,
+            "Earth": 0.0,
+            "Moon": 0.0,
+            "Uranus": 0.0,
+            "Pluto": 0.0,
+            "Pulsar": 0.0
+        }
+    }
+
+DEFAULT_WEIGHT_DATA = default_weight_data()
+
+def latest_sample():
+    """Return (seq, data, trace) for the newest sample, or the default payload under seq 0."""
+    seq, data, trace = sample_hub.latest()
+    if serial_reader is None or data is None:
+        return 0, DEFAULT_WEIGHT_DATA, {}
+    return seq, data, trace
+
+def _etag_for(seq: int) -> str:
+    # The boot ID keeps a restarted process from matching tags handed out by an older one
+    return f'"{BOOT_ID}-{seq}"'
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+@app.get(
+    "/api/weight",
+    response_model=ArduinoWeightData,
+    responses={304: {"description": "The sample matching If-None-Match is still the latest"}},
+)
+async def get_latest_weight(
+    request: Request,
+    after_seq: Optional[int] = Query(None, ge=0, description="Long-poll until a sample newer than this arrives"),
+    timeout: float = Query(30.0, ge=0, description="Long-poll timeout in seconds"),
+):
+    """Latest sample, with ETag/If-None-Match support and optional long-polling.
+
+    The body is the pre-encoded JSON frame shared with /ws, so it is neither
+    re-serialized nor re-validated per request.
+    """
     try:
-        data = serial_reader.get_latest_data_safe() if serial_reader else None
-        if data is None:
-            # Return default data if no serial data available
-            default_data = {
-                "raw": 0.0,
-                "grams": 0.0,
-                "mass_kg": 0.0,
-                "weights_newton": {
-                    "Sun": 0.0,
-                    "Mercury": 0.0,
-                    "Earth": 0.0,
-                    "Moon": 0.0,
-                    "Uranus": 0.0,
-                    "Pluto": 0.0,
-                    "Pulsar": 0.0
-                }
-            }
-            print(f"[DEBUG] API returning default data: {default_data}")
-            return default_data
-        print(f"[DEBUG] API returning serial data: {data}")
-        return data
+        if after_seq is not None and serial_reader is not None:
+            await sample_hub.wait_for_newer(after_seq, min(timeout, config.LONG_POLL_MAX_TIMEOUT))
+        seq, data, _ = latest_sample()
+        etag = _etag_for(seq)
+        headers = {"ETag": etag, "Cache-Control": "no-cache", "X-Sample-Seq": str(seq)}
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=frame_cache.get(seq, data, "json"), media_type="application/json", headers=headers)
     except Exception as e:
         print(f"Error in get_latest_weight: {e}")
-        error_data = {
-            "raw": 0.0,
-            "grams": 0.0,
-            "mass_kg": 0.0,
-            "weights_newton": {
-                "Sun": 0.0,
-                "Mercury": 0.0,
-                "Earth": 0.0,
-                "Moon": 0.0,
-                "Uranus": 0.0,
-                "Pluto": 0.0,
-                "Pulsar": 0.0
-            }
-        }
-        print(f"[DEBUG] API returning error fallback data: {error_data}")
-        return error_data
+        return DEFAULT_WEIGHT_DATA
+
+@app.get("/api/history")
+def get_history(
+    after_seq: int = Query(0, ge=0, description="Return samples with a sequence ID greater than this"),
+    limit: int = Query(500, ge=1, le=5000),
+    points: Optional[int] = Query(None, ge=2, le=config.CHART_MAX_POINTS, description="Downsample to at most this many points"),
+    window: float = Query(600.0, gt=0, description="Seconds of history to downsample"),
+    mode: str = Query("lttb", description="lttb (shape-preserving points) or minmax (min/max/mean per bucket)"),
+    field: str = Query("mass_kg", description="raw, grams or mass_kg"),
+):
+    """Retained samples newer than after_seq, oldest first (used for relay gap backfill).
+
+    With ?points=N, returns a chart-ready series of at most N points over the
+    last `window` seconds instead.
+    """
+    if points is not None:
+        if mode not in downsample.MODES or field not in downsample.FIELDS:
+            raise HTTPException(status_code=422, detail=f"mode must be one of {downsample.MODES}, field one of {downsample.FIELDS}")
+        series = chart_series.query(min(window, config.CHART_MAX_WINDOW), points, mode=mode, field=field)
+        return JSONResponse(dict(series, latest_seq=sample_hub.seq))
+    samples = sample_hub.history_after(after_seq, limit) if serial_reader is not None else []
+    oldest = sample_hub.history[0].get("seq", 0) if sample_hub.history else 0
+    # Samples are plain dicts already, so skip FastAPI's per-field encoding
+    return JSONResponse({"latest_seq": sample_hub.seq, "oldest_seq": oldest, "samples": samples})
+
+@app.get("/api/latency")
+def get_latency():
+    """Per-stage latency distributions over the most recent samples."""
+    return {
+        "latest_seq": sample_hub.seq,
+        "window": sample_hub.tracker.window,
+        "stages": sample_hub.tracker.summary(),
+    }
+
+# Per-connection record of recent sends kept for matching client receipt echoes
+SENT_HISTORY = 64
+
+async def _receive_client_messages(websocket: WebSocket, sent: OrderedDict):
+    """Consume client messages until disconnect.
+
+    Clients may echo receipt of a frame as {"ack": <seq>, "received_at": <epoch seconds>}.
+    """
+    tracker = sample_hub.tracker
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+        # A malformed message must never end the receiver: the send loop stops with it
+        try:
+            ack = json.loads(message.get("text") or "")
+            if not isinstance(ack, dict):
+                continue
+            seq = ack.get("ack")
+            if not isinstance(seq, int) or isinstance(seq, bool) or seq not in sent:
+                continue
+            # Match each seq once: acks of heartbeat resends would otherwise be
+            # timed against the first send
+            t_send, read_at = sent.pop(seq)
+            tracker.record("client_rtt", time.monotonic() - t_send)
+            received_at = ack.get("received_at")
+            if isinstance(received_at, (int, float)) and read_at is not None:
+                tracker.record("client_age", received_at - read_at)
+        except ValueError:
+            continue
+        except Exception as e:
+            print(f"Ignoring bad client message: {e}")
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await websocket_manager.connect(websocket)
+    encoding, subprotocol = encodings.negotiate(
+        websocket.query_params.get("encoding"),
+        websocket.scope.get("subprotocols", []),
+    )
+    await websocket_manager.connect(websocket, subprotocol=subprotocol)
+    sent = OrderedDict()
+    receiver = asyncio.create_task(_receive_client_messages(websocket, sent))
+    last_seq = None
     try:
-        while True:
-            try:
-                # Use the safe method to prevent blocking/deadlock
-                data = serial_reader.get_latest_data_safe() if serial_reader else None
-                if data is None:
-                    # Send default data if no serial data available
-                    default_data = {
-                        "raw": 0.0,
-                        "grams": 0.0,
-                        "mass_kg": 0.0,
-                        "weights_newton": {
-                            "Sun": 0.0,
-                            "Mercury": 0.0,
-                            "Earth": 0.0,
-                            "Moon": 0.0,
-                            "Uranus": 0.0,
-                            "Pluto": 0.0,
-                            "Pulsar": 0.0
-                        }
-                    }
-                    print(f"[DEBUG] Sending default data: {default_data}")
-                    await websocket.send_json(default_data)
-                else:
-                    print(f"[DEBUG] Sending serial data: {data}")
-                    await websocket.send_json(data)
-            except Exception as e:
-                print(f"Error getting serial data in WebSocket: {e}")
-                # Send default data on error
-                default_data = {
-                    "raw": 0.0,
-                    "grams": 0.0,
-                    "mass_kg": 0.0,
-                    "weights_newton": {
-                        "Sun": 0.0,
-                        "Mercury": 0.0,
-                        "Earth": 0.0,
-                        "Moon": 0.0,
-                        "Uranus": 0.0,
-                        "Pluto": 0.0,
-                        "Pulsar": 0.0
-                    }
-                }
-                print(f"[DEBUG] Sending error fallback data: {default_data}")
-                await websocket.send_json(default_data)
-            await asyncio.sleep(1.0)
+        if encoding == "f32":
+            await websocket.send_text(encodings.f32_schema_header())
+        while not receiver.done():
+            seq, data, trace = latest_sample()
+            # Encoded once per sample and encoding, then shared by every client
+            frame = frame_cache.get(seq, data, encoding)
+            t_send = time.monotonic()
+            if isinstance(frame, bytes):
+                await websocket.send_bytes(frame)
+            else:
+                await websocket.send_text(frame)
+            if seq and seq != last_seq:
+                sample_hub.tracker.record_send(trace, t_send)
+                sent[seq] = (t_send, data.get("read_at"))
+                if len(sent) > SENT_HISTORY:
+                    sent.popitem(last=False)
+            last_seq = seq
+            # Push as soon as a newer sample exists; resend the latest as a heartbeat otherwise
+            await sample_hub.wait_for_newer(seq, config.WS_SEND_INTERVAL)
+            remaining = config.WS_MIN_SEND_INTERVAL - (time.monotonic() - t_send)
+            if remaining > 0:
+                await asyncio.sleep(remaining)
     except WebSocketDisconnect:
-        websocket_manager.disconnect(websocket)
+        pass
     except asyncio.CancelledError:
         print("WebSocket connection cancelled")
-        websocket_manager.disconnect(websocket)
         raise
     except Exception as e:
         print(f"WebSocket error: {e}")
+    finally:
+        receiver.cancel()
+        # Always release the connection, however the client went away
         websocket_manager.disconnect(websocket)
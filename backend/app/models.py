@@ -2,7 +2,7 @@
 Pydantic models for weight data validation.
 """
 from pydantic import BaseModel, Field
-from typing import Dict
+from typing import Dict, Optional
 
 class WeightsNewton(BaseModel):
     Sun: float
@@ -18,3 +18,6 @@ class ArduinoWeightData(BaseModel):
     grams: float = Field(..., description="Weight in grams (can be negative)")
     mass_kg: float = Field(..., description="Mass in kg (can be negative)")
     weights_newton: WeightsNewton = Field(..., description="Weights on celestial bodies (N), can be negative")
+    seq: int = Field(0, description="Sample sequence ID (0 while no sample is available)")
+    read_at: Optional[float] = Field(None, description="Server wall-clock time of the serial read (epoch seconds)")
+    ts: Optional[int] = Field(None, description="Device uptime in ms when the firmware sent the reading")
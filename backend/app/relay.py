@@ -0,0 +1,172 @@
+"""
+RelayReader: Mirrors another backend's sample stream instead of reading a serial port.
+
+The relay long-polls the upstream's /api/weight?after_seq=N over one keep-alive
+connection, keeps the upstream sequence IDs, and backfills any samples it
+missed (after a reconnect, or when several arrive between polls) from the
+upstream's /api/history. Relays re-serve the stream through the same
+endpoints, so they can be chained.
+"""
+import http.client
+import json
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+
+from .serial_reader import SampleSource, validate_sample
+
+
+class UpstreamError(Exception):
+    """Raised when the upstream backend cannot be reached or answers badly."""
+
+
+class RelayReader(SampleSource):
+    def __init__(
+        self,
+        upstream_url: str,
+        start_seq: int = 0,
+        calibration: Optional[dict] = None,
+        poll_timeout: float = 25.0,
+        max_backoff: float = 10.0,
+        backfill_limit: int = 1000,
+    ):
+        super().__init__(start_seq=start_seq, calibration=calibration)
+        parts = urlsplit(upstream_url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported relay upstream scheme: {parts.scheme!r}")
+        self.upstream_url = upstream_url
+        self._scheme = parts.scheme
+        self._host = parts.hostname
+        self._port = parts.port
+        self._base_path = parts.path.rstrip("/")
+        self.poll_timeout = poll_timeout
+        self.max_backoff = max_backoff
+        self.backfill_limit = backfill_limit
+        self._conn = None
+        self._etag = None
+        self._running = True
+        self._stop_event = threading.Event()
+        self._connected = False
+        self.stats = {"reconnects": 0, "backfilled": 0, "missed": 0}
+        self._thread = threading.Thread(target=self._run, name="RelayReader", daemon=True)
+        self._thread.start()
+
+    @property
+    def connected(self) -> bool:
+        """Whether the last request to the upstream succeeded."""
+        return self._connected
+
+    def _connection(self):
+        if self._conn is None:
+            conn_cls = http.client.HTTPSConnection if self._scheme == "https" else http.client.HTTPConnection
+            # Leave headroom over the long-poll so a parked request is not cut off
+            self._conn = conn_cls(self._host, self._port, timeout=self.poll_timeout + 5)
+        return self._conn
+
+    def _close(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+    def _get(self, path: str, headers: Optional[dict] = None):
+        """GET over the pooled connection; returns (status, headers, body)."""
+        conn = self._connection()
+        try:
+            conn.request("GET", self._base_path + path, headers=headers or {})
+            response = conn.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException) as e:
+            self._close()
+            raise UpstreamError(f"upstream unreachable: {e}") from e
+        if response.will_close:
+            self._close()
+        if response.status not in (200, 304):
+            raise UpstreamError(f"upstream answered {response.status} for {path}")
+        return response.status, response.headers, body
+
+    def _accept(self, sample: dict):
+        """Publish one upstream sample under its upstream sequence ID."""
+        t_read = time.monotonic()
+        seq = sample.get("seq")
+        if not isinstance(seq, int) or seq <= 0 or not validate_sample(sample):
+            return
+        self._update_data(sample, {"t_read": t_read, "t_validate": time.monotonic()}, seq=seq)
+
+    def _backfill(self, after_seq: int, before_seq: int):
+        """Fetch and publish the samples strictly between after_seq and before_seq."""
+        wanted = min(before_seq - after_seq - 1, self.backfill_limit)
+        _, _, body = self._get(f"/api/history?after_seq={after_seq}&limit={wanted}")
+        recovered = [s for s in json.loads(body).get("samples", []) if s.get("seq", 0) < before_seq]
+        for sample in recovered:
+            self._accept(sample)
+        self.stats["backfilled"] += len(recovered)
+        self.stats["missed"] += (before_seq - after_seq - 1) - len(recovered)
+
+    def _poll_once(self) -> bool:
+        """One long-poll round; returns True if a new sample was published."""
+        headers = {"If-None-Match": self._etag} if self._etag else {}
+        status, response_headers, body = self._get(
+            f"/api/weight?after_seq={self._seq}&timeout={self.poll_timeout}", headers
+        )
+        self._connected = True
+        self._etag = response_headers.get("ETag") or self._etag
+        if status == 304:
+            return False
+        sample = json.loads(body)
+        seq = sample.get("seq", 0)
+        if not isinstance(seq, int) or seq <= 0 or seq == self._seq:
+            return False  # Upstream has no data yet, or nothing new before the poll timed out
+        if seq < self._seq:
+            print(f"Relay: upstream sequence restarted ({self._seq} -> {seq}), following it")
+        elif seq > self._seq + 1 and self._seq > 0:
+            self._backfill(self._seq, seq)
+        self._accept(sample)
+        return True
+
+    def _run(self):
+        backoff = 0.25
+        idle_backoff = 0.25
+        while self._running:
+            try:
+                started = time.monotonic()
+                if self._poll_once():
+                    idle_backoff = 0.25
+                elif time.monotonic() - started < self.poll_timeout / 2:
+                    # Upstream answered early without anything new (it is not
+                    # long-polling for us); don't hammer it with instant retries
+                    if self._stop_event.wait(idle_backoff):
+                        break
+                    idle_backoff = min(self.max_backoff, idle_backoff * 2)
+                backoff = 0.25
+            except (UpstreamError, ValueError) as e:
+                if not self._running:
+                    break
+                if self._connected:
+                    print(f"Relay: lost upstream {self.upstream_url}: {e}")
+                self._connected = False
+                self._etag = None
+                self.stats["reconnects"] += 1
+                if self._stop_event.wait(backoff):
+                    break
+                backoff = min(self.max_backoff, backoff * 2)
+        self._close()
+
+    def stop(self, timeout: float = 0.5):
+        """Stop relaying; an in-flight long-poll is abandoned by closing its socket."""
+        print("Stopping relay reader...")
+        self._running = False
+        self._stop_event.set()
+        conn = self._conn
+        if conn is not None and conn.sock is not None:
+            try:
+                # Unblocks a parked long-poll read in the relay thread
+                conn.sock.shutdown(2)
+            except OSError:
+                pass
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout=timeout)
+        print("Relay reader stop completed.")
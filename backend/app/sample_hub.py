@@ -0,0 +1,78 @@
+"""
+SampleHub: Event-loop side hand-off point for samples produced on the reader thread.
+
+The reader thread schedules publish() on the event loop; coroutines wait for a
+sample newer than the one they already have instead of polling on a timer.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import List, Optional, Tuple
+
+from .latency import LatencyTracker
+
+
+class SampleHub:
+    def __init__(self, tracker: Optional[LatencyTracker] = None, history_size: int = 3600):
+        self.tracker = tracker or LatencyTracker()
+        self.seq = 0
+        self.data: Optional[dict] = None
+        self.trace: dict = {}
+        # Recent samples in ascending seq order, for history queries and relay backfill
+        self.history: deque = deque(maxlen=history_size)
+        # One future per parked waiter, created on the waiter's own loop so the
+        # hub survives the app being started on a new event loop
+        self._waiters: set = set()
+
+    def threadsafe_publisher(self, loop: asyncio.AbstractEventLoop):
+        """Build a reader listener that forwards samples onto `loop`."""
+        def publish(data: dict, trace: Optional[dict] = None):
+            try:
+                loop.call_soon_threadsafe(self.publish, data, trace)
+            except RuntimeError:
+                pass  # Loop already closed during shutdown
+        return publish
+
+    def publish(self, data: dict, trace: Optional[dict] = None):
+        """Store a new sample and wake every waiter. Must run on the event loop."""
+        trace = dict(trace or {})
+        trace["t_publish"] = time.monotonic()
+        self.tracker.record_publish(trace)
+        self.seq = data.get("seq", self.seq + 1)
+        self.data = data
+        self.trace = trace
+        if self.history and self.history[-1].get("seq", 0) >= self.seq:
+            # Sequence went backwards (e.g. an upstream without saved state restarted)
+            self.history.clear()
+        self.history.append(data)
+        waiters, self._waiters = self._waiters, set()
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(True)
+
+    def latest(self) -> Tuple[int, Optional[dict], dict]:
+        return self.seq, self.data, self.trace
+
+    def history_after(self, after_seq: int, limit: int) -> List[dict]:
+        """The oldest `limit` retained samples with seq > after_seq, in order."""
+        newer = []
+        for sample in reversed(self.history):
+            if sample.get("seq", 0) <= after_seq:
+                break
+            newer.append(sample)
+        newer.reverse()
+        return newer[:limit]
+
+    async def wait_for_newer(self, after_seq: int, timeout: float) -> bool:
+        """Wait until a sample with seq > after_seq exists; False on timeout."""
+        if self.seq > after_seq:
+            return True
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self._waiters.discard(waiter)
+        return self.seq > after_seq
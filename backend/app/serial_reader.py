@@ -7,18 +7,162 @@ import json
 import time
 import platform
 import logging
-from typing import Optional
+from typing import Callable, List, Optional, Tuple
 import copy
 
-class SerialReader:
-    def __init__(self, port: str, baudrate: int = 115200):
-        self.port = port
-        self.baudrate = baudrate
+
+def open_serial(port: str, baudrate: int, timeout: float):
+    """Open a real serial port, or the built-in simulator for sim:// ports."""
+    if port.startswith("sim://"):
+        from .simulator import SimulatedSerial
+        return SimulatedSerial.from_url(port, timeout=timeout)
+    return serial.Serial(port, baudrate, timeout=timeout)
+
+
+def validate_sample(data) -> bool:
+    """Validate that the data has the expected Arduino structure."""
+    if not isinstance(data, dict):
+        return False
+    required_fields = ["raw", "grams", "mass_kg", "weights_newton"]
+    for field in required_fields:
+        if field not in data:
+            return False
+    if not isinstance(data["raw"], (int, float)):
+        return False
+    if not isinstance(data["grams"], (int, float)):
+        return False
+    if not isinstance(data["mass_kg"], (int, float)):
+        return False
+    if not isinstance(data["weights_newton"], dict):
+        return False
+    for k in ["Sun", "Mercury", "Earth", "Moon", "Uranus", "Pluto", "Pulsar"]:
+        if k not in data["weights_newton"]:
+            return False
+        if not isinstance(data["weights_newton"][k], (int, float)):
+            return False
+    return True
+
+
+class SampleSource:
+    """Shared plumbing for sample producers: latest sample, sequence IDs and listeners.
+
+    Subclasses feed samples in through _update_data() from their own thread.
+    """
+
+    def __init__(self, start_seq: int = 0, calibration: Optional[dict] = None):
         self._lock = threading.RLock()  # Use RLock for better concurrency
         self._latest_data = None
+        self._seq = start_seq  # Sequence ID of the latest sample; consumers key caches on it
+        self.calibration = calibration  # Last tare reported by the firmware, if any
+        self._listeners: List[Callable[[dict, dict], None]] = []
+
+    @property
+    def latest_data(self) -> Optional[dict]:
+        """Get the latest data safely with minimal lock contention."""
+        try:
+            # Use a very short timeout to prevent blocking
+            if self._lock.acquire(timeout=0.01):
+                try:
+                    # Return a deep copy to prevent external modification
+                    return copy.deepcopy(self._latest_data) if self._latest_data else None
+                finally:
+                    self._lock.release()
+            else:
+                # If we can't acquire the lock quickly, return None to prevent deadlock
+                # This is safer than returning potentially corrupted data
+                return None
+        except Exception:
+            # If any error occurs, return None to prevent crashes
+            return None
+
+    def _update_data(self, data: dict, trace: Optional[dict] = None, seq: Optional[int] = None):
+        """Internal method to update data with proper locking.
+
+        Tags the sample with its sequence ID (the next local one unless `seq`
+        is given) and wall-clock read time; `trace` carries the monotonic
+        pipeline timestamps handed to listeners.
+        """
+        trace = trace or {}
+        try:
+            with self._lock:
+                self._seq = self._seq + 1 if seq is None else seq
+                data["seq"] = self._seq
+                data.setdefault("read_at", time.time())
+                trace["seq"] = self._seq
+                self._latest_data = data
+        except Exception:
+            # If locking fails, ignore the update to prevent crashes
+            return
+        self._notify_listeners(data, trace)
+
+    @property
+    def seq(self) -> int:
+        """Sequence ID of the most recent sample (0 before the first one)."""
+        return self._seq
+
+    def add_listener(self, callback: Callable[[dict, dict], None]):
+        """Register a callback invoked from the reader thread for every valid sample.
+
+        Callbacks receive (data, trace) and must be cheap and non-blocking; they
+        run on the reader thread.
+        """
+        with self._lock:
+            self._listeners = self._listeners + [callback]
+
+    def remove_listener(self, callback: Callable[[dict, dict], None]):
+        """Unregister a callback previously passed to add_listener."""
+        with self._lock:
+            self._listeners = [cb for cb in self._listeners if cb is not callback]
+
+    def _notify_listeners(self, data: dict, trace: dict):
+        """Hand a sample to every registered listener, isolating their failures."""
+        # The list is replaced (never mutated) on add/remove, so iterating it is lock-free
+        for callback in self._listeners:
+            try:
+                callback(data, trace)
+            except Exception as e:
+                print(f"Error in sample listener: {e}")
+    
+    def get_latest_data_safe(self) -> Optional[dict]:
+        """Get latest data without blocking - returns None if data is not immediately available."""
+        try:
+            # Non-blocking attempt to get data
+            if self._lock.acquire(blocking=False):
+                try:
+                    return copy.deepcopy(self._latest_data) if self._latest_data else None
+                finally:
+                    self._lock.release()
+            else:
+                # Return None if we can't get the lock immediately
+                return None
+        except Exception:
+            return None
+    
+    def get_latest_sample(self) -> Tuple[int, Optional[dict]]:
+        """Return (seq, data) without copying.
+
+        Stored samples are replaced, never mutated, so the returned dict may be
+        shared between consumers as long as they treat it as read-only.
+        """
+        with self._lock:
+            return self._seq, self._latest_data
+
+
+class SerialReader(SampleSource):
+    def __init__(self, port: str, baudrate: int = 115200, start_seq: int = 0,
+                 calibration: Optional[dict] = None):
+        super().__init__(start_seq=start_seq, calibration=calibration)
+        self.port = port
+        self.baudrate = baudrate
         self._running = True
+        self._stop_event = None  # Set by _start_reader; interrupts retry/idle waits so stop() is prompt
         self._serial = None
         self._thread = None
+        self.restarts = 0
+        # Serializes stop() against a restart() running on a worker thread, and
+        # records a final stop so a late restart cannot revive the reader
+        self._lifecycle_lock = threading.RLock()
+        self._stopped = False
         self._read_timeout = 0.1  # Short timeout to prevent blocking
         self._start_reader()
     
@@ -29,54 +173,57 @@ class SerialReader:
         self.stop()
         return False
     
-    def __del__(self):
-        """Destructor to ensure cleanup on garbage collection."""
-        try:
-            self.stop()
-        except Exception:
-            pass  # Ignore exceptions during cleanup
-
     def _start_reader(self):
+        # Each reader thread owns its stop event and port, so after restart() a
+        # thread that is still unwinding cannot touch its successor's state
+        stop_event = self._stop_event = threading.Event()
+        
         def _reader():
             logger = logging.getLogger("SerialReader")
             logger.setLevel(logging.DEBUG)
             retry_count = 0
             max_retries = 3
+            port = None
             
-            while self._running:
-                time.sleep(0.1)  # Prevent CPU spinning too fast
+            while not stop_event.is_set():
+                if stop_event.wait(0.1):  # Prevent CPU spinning too fast
+                    break
                 try:
-                    if self._serial is None:
+                    if port is None:
                         print(f"Attempting to connect to serial port: {self.port}")
-                        self._serial = serial.Serial(self.port, self.baudrate, timeout=self._read_timeout)
+                        port = self._serial = open_serial(self.port, self.baudrate, self._read_timeout)
                         print(f"Successfully connected to {self.port}")
                         retry_count = 0
                     
-                    if not self._running:
+                    if stop_event.is_set():
                         break
                     
                     try:
-                        # Use non-blocking read with timeout
-                        if self._serial.in_waiting > 0:  # Check if data is available
-                            line = self._serial.readline().decode('utf-8', errors='ignore').strip()
-                            if line:
-                                try:
-                                    data = json.loads(line)
-                                    # Validate the data structure
-                                    if self._validate_data(data):
-                                        # Use the internal update method for thread-safe updates
-                                        self._update_data(data)
-                                    else:
-                                        logger.debug(f"Invalid data structure: {data}")
-                                except json.JSONDecodeError as e:
-                                    logger.debug(f"JSON decode error: {e}. Raw data: {line}")
-                                    continue
-                        else:
-                            # No data available, continue to next iteration
-                            continue
+                        # Drain everything already buffered; reading a single line per
+                        # wake-up lets the OS buffer (and display lag) grow without bound
+                        # whenever the firmware sends faster than we poll
+                        while not stop_event.is_set() and port.in_waiting > 0:
+                            line = port.readline().decode('utf-8', errors='ignore').strip()
+                            t_read = time.monotonic()
+                            if not line:
+                                break
+                            try:
+                                data = json.loads(line)
+                            except json.JSONDecodeError as e:
+                                logger.debug(f"JSON decode error: {e}. Raw data: {line}")
+                                continue
+                            if isinstance(data, dict) and data.get("event") == "tare":
+                                self._update_calibration(data)
+                                continue
+                            # Validate the data structure
+                            if self._validate_data(data):
+                                # Use the internal update method for thread-safe updates
+                                self._update_data(data, {"t_read": t_read, "t_validate": time.monotonic()})
+                            else:
+                                logger.debug(f"Invalid data structure: {data}")
                     except (UnicodeDecodeError, OSError) as e:
                         # Handle read errors that might occur during shutdown
-                        if not self._running:
+                        if stop_event.is_set():
                             break
                         logger.error(f"Read error: {e}")
                         continue
@@ -88,43 +235,33 @@ class SerialReader:
                         if retry_count <= max_retries:
                             print(f"Retrying connection in 5 seconds... (attempt {retry_count}/{max_retries})")
                             self._suggest_port_alternatives()
-                            time.sleep(5)
+                            stop_event.wait(5)
                         else:
                             print("Max retries reached. Serial connection failed.")
                             break
-                    self._serial = None
+                    port = self._serial = None
                     
                 except Exception as e:
                     print(f"Error reading from serial port: {e}")
-                    if not self._running:
+                    if stop_event.is_set():
                         break
                     continue
+            
+            # A port opened while stop() was running would otherwise leak its handle
+            if port is not None:
+                try:
+                    port.close()
+                except Exception:
+                    pass
+                if self._serial is port:
+                    self._serial = None
                     
-        self._thread = threading.Thread(target=_reader, daemon=True)
+        self._thread = threading.Thread(target=_reader, name="SerialReader", daemon=True)
         self._thread.start()
     
     def _validate_data(self, data):
         """Validate that the data has the expected Arduino structure."""
-        if not isinstance(data, dict):
-            return False
-        required_fields = ["raw", "grams", "mass_kg", "weights_newton"]
-        for field in required_fields:
-            if field not in data:
-                return False
-        if not isinstance(data["raw"], (int, float)):
-            return False
-        if not isinstance(data["grams"], (int, float)):
-            return False
-        if not isinstance(data["mass_kg"], (int, float)):
-            return False
-        if not isinstance(data["weights_newton"], dict):
-            return False
-        for k in ["Sun", "Mercury", "Earth", "Moon", "Uranus", "Pluto", "Pulsar"]:
-            if k not in data["weights_newton"]:
-                return False
-            if not isinstance(data["weights_newton"][k], (int, float)):
-                return False
-        return True
+        return validate_sample(data)
     
     def _suggest_port_alternatives(self):
         """Suggest alternative serial ports based on the operating system."""
@@ -144,90 +281,76 @@ class SerialReader:
         print("You can override this by setting the SERIAL_PORT environment variable.")
 
     @property
-    def latest_data(self) -> Optional[dict]:
-        """Get the latest data safely with minimal lock contention."""
-        try:
-            # Use a very short timeout to prevent blocking
-            if self._lock.acquire(timeout=0.01):
-                try:
-                    # Return a deep copy to prevent external modification
-                    return copy.deepcopy(self._latest_data) if self._latest_data else None
-                finally:
-                    self._lock.release()
-            else:
-                # If we can't acquire the lock quickly, return None to prevent deadlock
-                # This is safer than returning potentially corrupted data
-                return None
-        except Exception:
-            # If any error occurs, return None to prevent crashes
-            return None
+    def connected(self) -> bool:
+        """Whether the serial port is currently open."""
+        port = self._serial
+        return bool(port is not None and getattr(port, "is_open", False))
 
-    def _update_data(self, data: dict):
-        """Internal method to update data with proper locking."""
-        try:
-            with self._lock:
-                self._latest_data = data
-        except Exception:
-            # If locking fails, ignore the update to prevent crashes
-            pass
-    
-    def get_latest_data_safe(self) -> Optional[dict]:
-        """Get latest data without blocking - returns None if data is not immediately available."""
-        try:
-            # Non-blocking attempt to get data
-            if self._lock.acquire(blocking=False):
-                try:
-                    return copy.deepcopy(self._latest_data) if self._latest_data else None
-                finally:
-                    self._lock.release()
-            else:
-                # Return None if we can't get the lock immediately
-                return None
-        except Exception:
-            return None
-    
-    def stop(self):
-        """Stop the serial reader and close the connection."""
+    def _update_calibration(self, event: dict):
+        """Remember the tare offset announced by the firmware ({"event": "tare", "new_offset": N})."""
+        if not isinstance(event.get("new_offset"), (int, float)):
+            return
+        self.calibration = {"offset": event["new_offset"], "updated_at": time.time()}
+        print(f"Scale tared, new offset: {event['new_offset']}")
+
+    @property
+    def alive(self) -> bool:
+        """Whether the reader thread is running (it gives up after repeated open failures)."""
+        return bool(self._thread and self._thread.is_alive())
+
+    def restart(self, timeout: float = 0.5):
+        """Restart the reader in place with a fresh thread and port.
+
+        Sequence IDs, listeners and calibration are kept, so consumers see one
+        continuous stream.
+        """
+        with self._lifecycle_lock:
+            if self._stopped:
+                print("Serial reader was stopped, not restarting.")
+                return
+            print("Restarting serial reader...")
+            self._halt(timeout)
+            self.restarts += 1
+            self._running = True
+            self._start_reader()
+
+    def stop(self, timeout: float = 0.5):
+        """Stop the serial reader and close the connection.
+
+        Waits for an in-flight restart() to finish, then stops the reader it
+        started; later restart() calls do nothing.
+        """
+        with self._lifecycle_lock:
+            self._stopped = True
+            self._halt(timeout)
+
+    def _halt(self, timeout: float):
         print("Stopping serial reader...")
         self._running = False
+        self._stop_event.set()
         
-        # Close the serial connection with multiple attempts
-        if self._serial:
+        # Close the serial connection; this also unblocks a pending readline
+        port = self._serial
+        if port:
             try:
                 # Try to cancel any pending operations
-                self._serial.cancel_read()
+                port.cancel_read()
             except (AttributeError, Exception):
                 # cancel_read might not be available on all platforms
                 pass
-            
-            # Multiple attempts to close the connection
-            for attempt in range(3):
-                try:
-                    # Force close the serial connection
-                    if hasattr(self._serial, 'is_open') and self._serial.is_open:
-                        self._serial.close()
-                        print(f"Serial connection closed on attempt {attempt + 1}.")
-                        break
-                    elif self._serial:
-                        # Connection might already be closed
-                        print("Serial connection was already closed.")
-                        break
-                except Exception as e:
-                    print(f"Attempt {attempt + 1} - Error closing serial connection: {e}")
-                    if attempt < 2:  # Not the last attempt
-                        time.sleep(0.1)  # Brief pause before retry
-                    else:
-                        # Last attempt - try to force close
-                        try:
-                            self._serial.__del__()
-                        except Exception:
-                            pass
-            
+            try:
+                if getattr(port, 'is_open', False):
+                    port.close()
+                    print("Serial connection closed.")
+                else:
+                    print("Serial connection was already closed.")
+            except Exception as e:
+                print(f"Error closing serial connection: {e}")
             self._serial = None
         
-        # Wait for the thread to finish with shorter timeout
-        if self._thread and self._thread.is_alive():
-            self._thread.join(timeout=2)
+        # The reader only ever blocks for one read timeout, so a short join suffices
+        if self._thread and self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout=timeout)
             if self._thread.is_alive():
                 print("Warning: Serial reader thread did not stop gracefully within timeout.")
                 # The thread is daemon, so it will be killed when the main process exits
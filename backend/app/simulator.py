@@ -0,0 +1,101 @@
+"""
+SimulatedSerial: A stand-in for serial.Serial that emits firmware-style JSON lines.
+
+Select it with SERIAL_PORT=sim://?rate=10 (samples per second). Used for
+development without hardware and by the soak test harness.
+"""
+import json
+import random
+import threading
+import time
+from typing import List
+from urllib.parse import parse_qs, urlsplit
+
+GRAVITY = {
+    "Sun": 274.0,
+    "Mercury": 3.7,
+    "Earth": 9.807,
+    "Moon": 1.62,
+    "Uranus": 8.69,
+    "Pluto": 0.62,
+    "Pulsar": 1.0e12,
+}
+
+
+def make_payload(mass_kg: float) -> dict:
+    """Build a payload with the same shape as the ESP32 firmware output."""
+    grams = mass_kg * 1000.0
+    return {
+        "raw": int(grams * 228.6),
+        "grams": round(grams, 4),
+        "mass_kg": round(mass_kg, 6),
+        "weights_newton": {body: round(mass_kg * g, 6) for body, g in GRAVITY.items()},
+    }
+
+
+class SimulatedSerial:
+    """Produces one JSON line every 1/rate seconds, paced by the wall clock."""
+
+    def __init__(self, rate: float = 10.0, timeout: float = 0.1, seed: int = None):
+        self.rate = rate
+        self.timeout = timeout
+        self.is_open = True
+        self._random = random.Random(seed)
+        self._mass = 0.0
+        self._lock = threading.Lock()
+        self._next_at = time.monotonic()
+        self._pending: List[bytes] = []
+        self.lines_sent = 0
+
+    @classmethod
+    def from_url(cls, url: str, timeout: float = 0.1) -> "SimulatedSerial":
+        query = parse_qs(urlsplit(url).query)
+        rate = float(query.get("rate", ["10"])[0])
+        seed = int(query["seed"][0]) if "seed" in query else None
+        return cls(rate=rate, timeout=timeout, seed=seed)
+
+    def _produce(self):
+        """Generate every line that is due by now (at most one second's worth)."""
+        now = time.monotonic()
+        if now - self._next_at > 1.0:
+            # Consumer stalled: behave like a UART FIFO and keep only recent data
+            self._next_at = now - 1.0
+        while self._next_at <= now:
+            self._mass = max(0.0, self._mass + self._random.uniform(-0.5, 0.5))
+            line = json.dumps(make_payload(self._mass)) + "\n"
+            self._pending.append(line.encode("utf-8"))
+            self._next_at += 1.0 / self.rate
+        # Bound the simulated FIFO like real hardware would
+        del self._pending[:-max(1, int(self.rate))]
+
+    @property
+    def in_waiting(self) -> int:
+        if not self.is_open:
+            raise OSError("Simulated port is closed")
+        with self._lock:
+            self._produce()
+            return sum(len(line) for line in self._pending)
+
+    def readline(self) -> bytes:
+        deadline = time.monotonic() + self.timeout
+        while self.is_open:
+            with self._lock:
+                self._produce()
+                if self._pending:
+                    self.lines_sent += 1
+                    return self._pending.pop(0)
+            if time.monotonic() >= deadline:
+                return b""
+            time.sleep(min(0.01, 1.0 / self.rate))
+        raise OSError("Simulated port is closed")
+
+    def inject(self, line: str):
+        """Queue an arbitrary raw line (e.g. a firmware event) ahead of generated samples."""
+        with self._lock:
+            self._pending.insert(0, (line.rstrip("\n") + "\n").encode("utf-8"))
+
+    def cancel_read(self):
+        pass
+
+    def close(self):
+        self.is_open = False
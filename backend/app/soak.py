@@ -0,0 +1,232 @@
+"""
+Soak test harness: runs the app against a simulated serial source while churning
+WebSocket clients, and checks that memory, threads, fds and latency stay flat.
+
+Time is accelerated by sending frames and generating samples much faster than
+in the exhibit, so an hour of soak covers weeks of normal traffic. Example:
+
+    python -m app.soak --duration 3600 --concurrency 50
+"""
+import argparse
+import asyncio
+import contextlib
+import gc
+import json
+import os
+import random
+import resource
+import sys
+import threading
+import time
+from typing import List, Optional
+
+from . import config
+
+
+def rss_bytes() -> int:
+    """Current resident set size (falls back to peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def open_fd_count() -> Optional[int]:
+    """Number of open file descriptors, or None if the platform cannot tell."""
+    for path in ("/proc/self/fd", "/dev/fd"):
+        try:
+            return len(os.listdir(path))
+        except OSError:
+            continue
+    return None
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100.0))]
+
+
+async def _ws_session(app, frames: int, mode: str, latencies: List[float]):
+    """Drive one /ws connection over raw ASGI until `frames` frames arrive, then drop it.
+
+    mode "reset" makes the next send fail like a TCP reset, "cancel" tears the
+    connection task down from the server side, as uvicorn does on shutdown.
+    """
+    inbox: asyncio.Queue = asyncio.Queue()
+    inbox.put_nowait({"type": "websocket.connect"})
+    received = 0
+    started = time.monotonic()
+    done = asyncio.Event()
+
+    async def receive():
+        return await inbox.get()
+
+    async def send(message):
+        nonlocal received
+        if message["type"] != "websocket.send":
+            return
+        if received >= frames:
+            raise ConnectionResetError("soak client dropped the connection")
+        if received == 0:
+            latencies.append(time.monotonic() - started)
+        received += 1
+        if received >= frames:
+            done.set()
+
+    scope = {
+        "type": "websocket",
+        "asgi": {"version": "3.0"},
+        "scheme": "ws",
+        "http_version": "1.1",
+        "path": "/ws",
+        "raw_path": b"/ws",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"soak")],
+        "client": ("127.0.0.1", 0),
+        "server": ("127.0.0.1", 80),
+        "subprotocols": [],
+    }
+    task = asyncio.ensure_future(app(scope, receive, send))
+    waiter = asyncio.ensure_future(done.wait())
+    await asyncio.wait({task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+    if mode == "cancel" and not task.done():
+        task.cancel()
+    with contextlib.suppress(asyncio.CancelledError, Exception):
+        await task
+    waiter.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await waiter
+
+
+def _snapshot(main_mod, latencies: List[float], sessions: int, elapsed: float) -> dict:
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "sessions": sessions,
+        "rss_bytes": rss_bytes(),
+        "threads": threading.active_count(),
+        "fds": open_fd_count(),
+        "active_connections": len(main_mod.websocket_manager.active_connections),
+        "latency_p95_s": percentile(latencies, 95),
+    }
+
+
+async def run_soak(
+    duration: float = 60.0,
+    warmup: float = 2.0,
+    concurrency: int = 20,
+    frames_per_session: int = 3,
+    cancel_ratio: float = 0.3,
+    sample_rate: float = 200.0,
+    send_interval: float = 0.001,
+    report_every: float = 5.0,
+) -> dict:
+    """Run the soak and return a report with a baseline, periodic snapshots and a final snapshot."""
+    from . import main as main_mod
+
+    saved = (config.SERIAL_PORT, config.WS_SEND_INTERVAL, config.WS_MIN_SEND_INTERVAL, config.STATE_FILE)
+    config.SERIAL_PORT = f"sim://?rate={sample_rate}"
+    config.STATE_FILE = ""  # Never hand simulated readings to the real exhibit
+    config.WS_SEND_INTERVAL = send_interval
+    config.WS_MIN_SEND_INTERVAL = 0.0
+    rng = random.Random(0)
+    snapshots = []
+    sessions = 0
+    try:
+        async with main_mod.lifespan(main_mod.app):
+            async def churn(until: float, latencies: List[float]):
+                nonlocal sessions
+                while time.monotonic() < until:
+                    batch = [
+                        _ws_session(
+                            main_mod.app,
+                            frames_per_session,
+                            "cancel" if rng.random() < cancel_ratio else "reset",
+                            latencies,
+                        )
+                        for _ in range(concurrency)
+                    ]
+                    await asyncio.gather(*batch)
+                    sessions += concurrency
+
+            start = time.monotonic()
+            await churn(start + warmup, [])
+            gc.collect()
+            baseline = _snapshot(main_mod, [], sessions, time.monotonic() - start)
+
+            deadline = time.monotonic() + duration
+            while time.monotonic() < deadline:
+                window: List[float] = []
+                await churn(min(deadline, time.monotonic() + report_every), window)
+                snapshots.append(_snapshot(main_mod, window, sessions, time.monotonic() - start))
+
+            gc.collect()
+            final = _snapshot(main_mod, [], sessions, time.monotonic() - start)
+    finally:
+        config.SERIAL_PORT, config.WS_SEND_INTERVAL, config.WS_MIN_SEND_INTERVAL, config.STATE_FILE = saved
+    return {"baseline": baseline, "snapshots": snapshots, "final": final}
+
+
+def check_report(report: dict, max_rss_growth: int = 16 * 1024 * 1024, max_latency_ratio: float = 3.0) -> List[str]:
+    """Return a list of human-readable violations (empty means the soak passed)."""
+    failures = []
+    baseline, final, snapshots = report["baseline"], report["final"], report["snapshots"]
+    growth = final["rss_bytes"] - baseline["rss_bytes"]
+    if growth > max_rss_growth:
+        failures.append(f"RSS grew by {growth / 1e6:.1f} MB")
+    # Only growth is a leak: threads left over from before the run (e.g. a previous
+    # reader still unwinding its stop) may exit during it and lower the count
+    if final["threads"] > baseline["threads"]:
+        failures.append(f"thread count grew {baseline['threads']} -> {final['threads']}")
+    if baseline["fds"] is not None and final["fds"] - baseline["fds"] > 2:
+        failures.append(f"fd count grew {baseline['fds']} -> {final['fds']}")
+    if final["active_connections"] != 0:
+        failures.append(f"{final['active_connections']} WebSocket connections leaked")
+    latencies = [s["latency_p95_s"] for s in snapshots if s["latency_p95_s"] is not None]
+    if len(latencies) >= 2:
+        first, last = latencies[0], latencies[-1]
+        # Absolute floor keeps scheduler noise on tiny latencies from failing the run
+        if last > max(first * max_latency_ratio, first + 0.05):
+            failures.append(f"p95 connect latency degraded {first * 1000:.1f} ms -> {last * 1000:.1f} ms")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Soak test the weight exhibit backend")
+    parser.add_argument("--duration", type=float, default=600.0, help="seconds to run after warmup")
+    parser.add_argument("--warmup", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=50, help="connections opened per churn round")
+    parser.add_argument("--frames", type=int, default=3, help="frames received before each drop")
+    parser.add_argument("--cancel-ratio", type=float, default=0.3, help="share of server-side teardowns")
+    parser.add_argument("--sample-rate", type=float, default=200.0, help="simulated samples per second")
+    parser.add_argument("--send-interval", type=float, default=0.001, help="accelerated WS_SEND_INTERVAL")
+    parser.add_argument("--report-every", type=float, default=30.0)
+    args = parser.parse_args(argv)
+
+    # The app prints per frame; keep that out of the report and out of memory
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        report = asyncio.run(run_soak(
+            duration=args.duration,
+            warmup=args.warmup,
+            concurrency=args.concurrency,
+            frames_per_session=args.frames,
+            cancel_ratio=args.cancel_ratio,
+            sample_rate=args.sample_rate,
+            send_interval=args.send_interval,
+            report_every=args.report_every,
+        ))
+    print(json.dumps(report, indent=2))
+    failures = check_report(report)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print("PASS")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,28 @@
+"""
+Systemd socket activation support (sd_listen_fds protocol).
+
+When the service is started through a .socket unit, systemd owns the
+listening socket and keeps accepting connections into its backlog while
+the backend restarts, so clients queue instead of being refused.
+"""
+import os
+from typing import Optional
+
+SD_LISTEN_FDS_START = 3
+
+
+def listen_fd() -> Optional[int]:
+    """Return the first listening socket passed by systemd, or None.
+
+    Like sd_listen_fds(unset_environment=1), the LISTEN_* variables are
+    cleared so child processes do not try to claim the same socket.
+    """
+    if os.environ.get("LISTEN_PID") != str(os.getpid()):
+        return None
+    try:
+        count = int(os.environ.get("LISTEN_FDS", "0"))
+    except ValueError:
+        return None
+    for name in ("LISTEN_PID", "LISTEN_FDS", "LISTEN_FDNAMES"):
+        os.environ.pop(name, None)
+    return SD_LISTEN_FDS_START if count >= 1 else None
@@ -0,0 +1,58 @@
+"""
+StateStore: Persists the last sample and calibration state across restarts.
+
+The file is replaced atomically so a crash mid-write never leaves a partial
+state behind; an unreadable file is treated as "no state".
+"""
+import json
+import os
+import time
+from typing import Optional
+
+
+class StateStore:
+    def __init__(self, path: str, max_sample_age: float = 60.0):
+        self.path = path
+        self.max_sample_age = max_sample_age
+
+    def save(self, seq: int, sample: Optional[dict], calibration: Optional[dict]):
+        """Atomically write the state file."""
+        state = {
+            "saved_at": time.time(),
+            "seq": seq,
+            "sample": sample,
+            "calibration": calibration,
+        }
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def load(self) -> dict:
+        """Return the saved state; a sample older than max_sample_age is dropped.
+
+        The sequence ID and calibration are always restored so IDs keep
+        increasing and the tare offset survives, but a stale reading must not
+        be shown as if it were current.
+        """
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return {"seq": 0, "sample": None, "calibration": None}
+        if not isinstance(state, dict):
+            return {"seq": 0, "sample": None, "calibration": None}
+        sample = state.get("sample")
+        saved_at = state.get("saved_at") or 0
+        if sample is not None and time.time() - saved_at > self.max_sample_age:
+            sample = None
+        return {
+            "seq": int(state.get("seq") or 0),
+            "sample": sample,
+            "calibration": state.get("calibration"),
+        }
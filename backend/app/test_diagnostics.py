@@ -0,0 +1,73 @@
+"""
+Unit tests for the /debug/profile and /debug/memory diagnostics endpoints.
+"""
+import threading
+import tracemalloc
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main_mod
+from app import diagnostics
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main_mod.config, "DEBUG_ENDPOINTS", True)
+    yield TestClient(main_mod.app)
+    diagnostics.memory_report(stop=True)
+
+
+def test_endpoints_hidden_by_default(monkeypatch):
+    monkeypatch.setattr(main_mod.config, "DEBUG_ENDPOINTS", False)
+    client = TestClient(main_mod.app)
+    assert client.get("/debug/profile?seconds=0.1").status_code == 404
+    assert client.get("/debug/memory").status_code == 404
+    assert not tracemalloc.is_tracing()
+
+
+def test_profile_samples_other_threads(client):
+    stop = threading.Event()
+
+    def busy_reader():
+        while not stop.is_set():
+            sum(range(1000))
+
+    worker = threading.Thread(target=busy_reader, name="FakeReader", daemon=True)
+    worker.start()
+    try:
+        response = client.get("/debug/profile?seconds=0.3")
+    finally:
+        stop.set()
+        worker.join()
+    assert response.status_code == 200
+    lines = response.text.splitlines()
+    assert any(line.startswith("FakeReader;") and "busy_reader" in line for line in lines)
+    # Every line is "<stack> <count>" as expected by flamegraph tooling
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+
+def test_profile_rejects_concurrent_runs(client):
+    assert diagnostics._profile_lock.acquire(blocking=False)
+    try:
+        assert client.get("/debug/profile?seconds=0.1").status_code == 409
+    finally:
+        diagnostics._profile_lock.release()
+
+
+def test_memory_start_report_and_stop(client):
+    first = client.get("/debug/memory").json()
+    assert first["started"] is True
+    assert tracemalloc.get_traceback_limit() == 1  # Deeper stacks would only add overhead
+    assert tracemalloc.is_tracing()
+
+    retained = [bytearray(1024) for _ in range(200)]
+    second = client.get("/debug/memory?limit=5").json()
+    assert second["started"] is False
+    assert len(second["top"]) <= 5
+    assert any("test_diagnostics.py" in row["location"] for row in second["diff_since_last"])
+    del retained
+
+    stopped = client.get("/debug/memory?stop=true").json()
+    assert stopped == {"tracing": False, "stopped": True}
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,142 @@
+"""
+Unit tests for chart downsampling (LTTB and min/max/mean buckets).
+"""
+import math
+import os
+import time
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+import app.main as main_mod
+from app.downsample import ChartSeries
+from app.sample_hub import SampleHub
+
+
+def feed(series, start, stop, rate=10.0, spike_at=None):
+    for i in range(start, stop):
+        mass = math.sin(i / 50.0) + (5.0 if i == spike_at else 0.0)
+        series.append({"read_at": i / rate, "raw": i, "grams": mass * 1000.0, "mass_kg": mass})
+
+
+def test_minmax_buckets_match_brute_force():
+    series = ChartSeries(capacity=10000)
+    feed(series, 0, 1000)  # 100 seconds at 10 samples/s
+    out = series.query(window=100.0, points=20, mode="minmax", now=100.0)
+    assert out["points"] <= 20
+    values = np.sin(np.arange(1000) / 50.0)
+    t = np.arange(1000) / 10.0
+    for start, lo, hi, mean, count in zip(out["t"], out["min"], out["max"], out["mean"], out["count"]):
+        in_bucket = values[(t >= start - 1e-9) & (t < start + 5.0 - 1e-9)]
+        assert count == len(in_bucket)
+        assert lo == in_bucket.min() and hi == in_bucket.max()
+        assert abs(mean - in_bucket.mean()) < 1e-9
+
+
+def test_lttb_keeps_spikes_and_newest_point():
+    series = ChartSeries(capacity=10000)
+    feed(series, 0, 3000, spike_at=1234)
+    out = series.query(window=300.0, points=100, now=300.0)
+    assert 90 <= out["points"] <= 100
+    assert max(out["value"]) == math.sin(1234 / 50.0) + 5.0  # A one-sample spike survives 30x reduction
+    assert out["t"][-1] == 299.9
+    assert out["t"] == sorted(out["t"])
+
+
+def test_incremental_queries_match_a_fresh_computation():
+    live = ChartSeries(capacity=10000)
+    for chunk in range(0, 3000, 37):
+        feed(live, chunk, min(chunk + 37, 3000), spike_at=2222)
+        now = min(chunk + 37, 3000) / 10.0
+        for mode in ("lttb", "minmax"):
+            live.query(window=120.0, points=60, mode=mode, now=now)
+    fresh = ChartSeries(capacity=10000)
+    feed(fresh, 0, 3000, spike_at=2222)
+    for mode in ("lttb", "minmax"):
+        # LTTB chains from where a resolution was first queried, so anchor both alike
+        fresh.query(window=120.0, points=60, mode=mode, now=3.7)
+        assert live.query(window=120.0, points=60, mode=mode, now=300.0) == fresh.query(
+            window=120.0, points=60, mode=mode, now=300.0
+        )
+
+
+def test_windows_sharing_a_bucket_width_do_not_truncate_each_other():
+    mixed = ChartSeries(capacity=20000)
+    feed(mixed, 0, 12000)  # 20 minutes at 10 samples/s
+    fresh = ChartSeries(capacity=20000)
+    feed(fresh, 0, 12000)
+    for mode in ("lttb", "minmax"):
+        # Both are 2 s buckets; the small window must not evict what the large one needs
+        mixed.query(window=100.0, points=50, mode=mode, now=1200.0)
+        large = mixed.query(window=1200.0, points=600, mode=mode, now=1200.0)
+        assert large == fresh.query(window=1200.0, points=600, mode=mode, now=1200.0)
+        assert large["points"] == 599 and large["t"][0] < 3.0
+        small = mixed.query(window=100.0, points=50, mode=mode, now=1200.0)
+        assert small["points"] == 49 and small["t"][0] >= 1100.0
+
+
+def test_minmax_is_independent_of_query_history():
+    rng = np.random.default_rng(7)
+    # 5 Hz readings with gaps: many fall on bucket edges, where t / width and
+    # bucket * width can round to different sides
+    times = 1000.0 + np.cumsum(rng.integers(1, 4, size=3000)) / 5.0
+    samples = [{"read_at": float(t), "mass_kg": float(v)} for t, v in zip(times, rng.normal(size=len(times)))]
+    live = ChartSeries(capacity=2000)
+    shapes = [(40.0, 50), (40.0, 200), (120.0, 60), (10.0, 50)]
+    for sample in samples:
+        live.append(sample)
+        if rng.random() < 0.1:
+            window, points = shapes[rng.integers(len(shapes))]
+            live.query(window, points, mode="minmax", now=sample["read_at"])
+    now = samples[-1]["read_at"]
+    for window, points in shapes:
+        fresh = ChartSeries(capacity=2000)
+        for sample in samples:
+            fresh.append(sample)
+        assert live.query(window, points, mode="minmax", now=now) == fresh.query(
+            window, points, mode="minmax", now=now
+        )
+
+
+def test_capacity_bound_and_persistence_roundtrip(tmp_path):
+    series = ChartSeries(capacity=100)
+    feed(series, 0, 1000)
+    assert len(series) == 100
+    snapshot = series.snapshot()
+    assert snapshot["read_at"][0] == 90.0
+    path = str(tmp_path / "chart-history.npy")
+    series.save(path)
+    assert os.path.getsize(path) < 100 * 20 + 256  # 20 bytes per sample plus the header
+    restored = ChartSeries(capacity=100)
+    assert restored.restore(path)
+    assert np.array_equal(restored.snapshot(), snapshot)
+    series.append({"read_at": 1.0, "mass_kg": 0.0})  # Out of time order: dropped
+    assert len(series) == 100 and np.array_equal(series.snapshot(), snapshot)
+    (tmp_path / "corrupt.npy").write_bytes(b"not numpy")
+    assert not restored.restore(str(tmp_path / "corrupt.npy"))
+    assert not restored.restore(str(tmp_path / "missing.npy"))
+
+
+def test_saving_full_history_is_fast(tmp_path):
+    series = ChartSeries()
+    for i in range(series.capacity):
+        series.append({"read_at": 1.7e9 + i / 5.0, "raw": i, "grams": i / 10.0, "mass_kg": i / 1e4})
+    start = time.monotonic()
+    series.save(str(tmp_path / "chart-history.npy"), sync=False)
+    # The shutdown path; the old JSON dump of the same data took ~200 ms
+    assert time.monotonic() - start < 0.05
+
+
+def test_history_points_endpoint(monkeypatch):
+    series = ChartSeries(capacity=10000)
+    feed(series, 0, 2000)
+    monkeypatch.setattr(main_mod, "chart_series", series)
+    monkeypatch.setattr(main_mod, "sample_hub", SampleHub())
+    client = TestClient(main_mod.app)
+    # The synthetic samples are from 1970, so a window ending now would be empty
+    monkeypatch.setattr("app.downsample.time.time", lambda: 200.0)
+    body = client.get("/api/history?points=50&window=200").json()
+    assert body["mode"] == "lttb" and body["field"] == "mass_kg"
+    assert 0 < body["points"] <= 50
+    assert len(body["t"]) == len(body["value"]) == body["points"]
+    assert client.get("/api/history?points=50&mode=median").status_code == 422
@@ -0,0 +1,91 @@
+"""
+Unit tests for negotiated /ws frame encodings.
+"""
+import json
+
+import msgpack
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main_mod
+from app import encoding
+from app.sample_hub import SampleHub
+
+SAMPLE = {
+    "raw": -153425,
+    "grams": -671.1932,
+    "mass_kg": -0.671193,
+    "weights_newton": {
+        "Sun": -183.9069,
+        "Mercury": -2.483415,
+        "Earth": -6.582392,
+        "Moon": -1.087333,
+        "Uranus": -5.832668,
+        "Pluto": -0.41614,
+        "Pulsar": -6.711932e11
+    }
+}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    hub = SampleHub()
+    hub.publish(dict(SAMPLE, seq=1))
+    monkeypatch.setattr(main_mod, "sample_hub", hub)
+    monkeypatch.setattr(main_mod, "serial_reader", object())
+    monkeypatch.setattr(main_mod.config, "WS_SEND_INTERVAL", 0.01)
+    monkeypatch.setattr(main_mod.config, "WS_MIN_SEND_INTERVAL", 0.0)
+    monkeypatch.setattr(main_mod, "frame_cache", encoding.FrameCache())
+    return TestClient(main_mod.app)
+
+
+def test_negotiate_prefers_query_then_subprotocol():
+    assert encoding.negotiate("f32", []) == ("f32", None)
+    assert encoding.negotiate("F32", ["weight.f32"]) == ("f32", "weight.f32")
+    assert encoding.negotiate(None, ["chat", "weight.msgpack", "weight.f32"]) == ("msgpack", "weight.msgpack")
+    assert encoding.negotiate("bogus", []) == ("json", None)
+    assert encoding.negotiate(None, []) == ("json", None)
+
+
+def test_f32_roundtrip_and_size():
+    frame = encoding.encode(SAMPLE, "f32")
+    assert len(frame) == 4 * len(encoding.F32_FIELDS)
+    assert len(json.dumps(SAMPLE)) / len(frame) > 5
+    decoded = encoding.decode_f32(frame)
+    assert decoded["raw"] == SAMPLE["raw"]
+    assert decoded["seq"] == 0
+    assert decoded["weights_newton"]["Pulsar"] == pytest.approx(SAMPLE["weights_newton"]["Pulsar"], rel=1e-6)
+
+
+def test_frame_cache_encodes_once_per_version():
+    cache = encoding.FrameCache()
+    first = cache.get(1, SAMPLE, "msgpack")
+    assert cache.get(1, SAMPLE, "msgpack") is first
+    cache.get(1, SAMPLE, "json")
+    assert cache.encodes == 2
+    cache.get(2, SAMPLE, "msgpack")
+    assert cache.encodes == 3
+
+
+def test_ws_json_is_default(client):
+    with client.websocket_connect("/ws") as ws:
+        assert ws.receive_json() == dict(SAMPLE, seq=1)
+
+
+def test_ws_f32_sends_schema_then_packed_frames(client):
+    with client.websocket_connect("/ws?encoding=f32") as ws:
+        header = json.loads(ws.receive_text())
+        assert header["type"] == "schema"
+        assert header["fields"] == encoding.F32_FIELDS
+        decoded = encoding.decode_f32(ws.receive_bytes())
+        assert decoded["seq"] == 1
+        assert decoded["grams"] == pytest.approx(SAMPLE["grams"], rel=1e-6)
+
+
+def test_ws_msgpack_via_subprotocol_shares_frames(client):
+    with client.websocket_connect("/ws", subprotocols=["weight.msgpack"]) as a, \
+            client.websocket_connect("/ws", subprotocols=["weight.msgpack"]) as b:
+        assert a.accepted_subprotocol == "weight.msgpack"
+        assert msgpack.unpackb(a.receive_bytes()) == dict(SAMPLE, seq=1)
+        assert msgpack.unpackb(b.receive_bytes()) == dict(SAMPLE, seq=1)
+    assert main_mod.frame_cache.encodes == 1
@@ -0,0 +1,299 @@
+"""
+Unit tests for the upstream Forwarder against a local stand-in HTTP collector.
+"""
+import gzip
+import json
+import os
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.forwarder import BatchRejected, Forwarder, ForwardError, HttpTransport, parse_retry_after
+
+
+class _Collector(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like a real collector
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        lines = gzip.decompress(body).decode("utf-8").splitlines()
+        self.server.batches.append([json.loads(line) for line in lines])
+        self.server.peers.add(self.client_address)
+        self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def collector():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Collector)
+    server.batches = []
+    server.peers = set()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def _url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}/ingest"
+
+
+def test_batches_are_compressed_and_delivered_over_one_connection(collector, tmp_path):
+    fwd = Forwarder(_url(collector), batch_size=5, flush_interval=0.2, spool_dir=str(tmp_path))
+    try:
+        for i in range(10):
+            fwd.submit({"raw": i, "grams": float(i)})
+        assert _wait_for(lambda: sum(len(b) for b in collector.batches) == 10)
+    finally:
+        fwd.stop()
+    assert [s["raw"] for b in collector.batches for s in b] == list(range(10))
+    assert all("received_at" in s for b in collector.batches for s in b)
+    assert len(collector.peers) == 1  # Keep-alive connection was reused
+    assert fwd.stats()["sent_samples"] == 10
+
+
+def test_unreachable_upstream_spools_then_drains(tmp_path):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Collector)
+    server.batches = []
+    server.peers = set()
+    port = server.server_address[1]
+    server.server_close()  # Nothing is listening on the port yet
+
+    fwd = Forwarder(f"http://127.0.0.1:{port}/", batch_size=2, flush_interval=0.1,
+                    spool_dir=str(tmp_path), max_backoff=0.2)
+    try:
+        for i in range(4):
+            fwd.submit({"raw": i})
+        assert _wait_for(lambda: fwd.stats()["spooled_pending"] >= 2)
+
+        server = ThreadingHTTPServer(("127.0.0.1", port), _Collector)
+        server.batches = []
+        server.peers = set()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        assert _wait_for(lambda: fwd.stats()["spooled_pending"] == 0)
+        assert _wait_for(lambda: sum(len(b) for b in server.batches) == 4)
+        # Spooled data is replayed oldest-first, and counted once delivered
+        assert [s["raw"] for b in server.batches for s in b] == [0, 1, 2, 3]
+        assert _wait_for(lambda: fwd.stats()["sent_samples"] == 4)
+    finally:
+        fwd.stop()
+        server.shutdown()
+        server.server_close()
+
+
+def test_full_queue_drops_instead_of_blocking(tmp_path):
+    class BlockedTransport:
+        def __init__(self):
+            self.release = threading.Event()
+
+        def send(self, payload):
+            self.release.wait(2)
+            raise ForwardError("still down")
+
+        def close(self):
+            self.release.set()
+
+    fwd = Forwarder("http://unused/", batch_size=1, flush_interval=0.05, spool_dir=str(tmp_path),
+                    max_queue=3, transport=BlockedTransport())
+    try:
+        start = time.monotonic()
+        for i in range(50):
+            fwd.submit({"raw": i})
+        assert time.monotonic() - start < 0.5
+        assert fwd.stats()["dropped_samples"] > 0
+    finally:
+        fwd.stop()
+
+
+def test_spool_is_bounded(tmp_path):
+    class DownTransport:
+        def send(self, payload):
+            raise ForwardError("down")
+
+        def close(self):
+            pass
+
+    fwd = Forwarder("http://unused/", batch_size=1, flush_interval=0.01, spool_dir=str(tmp_path),
+                    max_spool_files=3, transport=DownTransport())
+    try:
+        for i in range(10):
+            fwd.submit({"raw": i})
+        assert _wait_for(lambda: fwd.stats()["spooled_batches"] >= 10)
+    finally:
+        fwd.stop()
+    assert len([n for n in os.listdir(tmp_path) if n.endswith(".ndjson.gz")]) <= 3
+    stats = fwd.stats()
+    assert stats["spooled_pending"] == len(os.listdir(tmp_path))
+    # Evicted batches are lost data and show up as such
+    assert stats["dropped_samples"] == 10 - stats["spooled_pending"]
+
+
+def test_spool_depth_is_tracked_without_listing_the_directory(collector, tmp_path, monkeypatch):
+    for i in range(3):
+        (tmp_path / f"{i:020d}.ndjson.gz").write_bytes(Forwarder.encode_batch([{"raw": i}]))
+    listings = []
+    real_listdir = os.listdir
+    monkeypatch.setattr("app.forwarder.os.listdir", lambda path: listings.append(path) or real_listdir(path))
+    fwd = Forwarder(_url(collector), batch_size=1, flush_interval=0.05, spool_dir=str(tmp_path))
+    try:
+        # A backlog left by the previous run is picked up and drained
+        assert _wait_for(lambda: fwd.stats()["spooled_pending"] == 0)
+        assert [b[0]["raw"] for b in collector.batches[:3]] == [0, 1, 2]
+        listed = len(listings)
+        for _ in range(50):
+            fwd.stats()
+        fwd.submit({"raw": 3})
+        assert _wait_for(lambda: fwd.stats()["sent_samples"] == 1)
+        assert len(listings) == listed  # Neither /health nor live sends touch the directory
+    finally:
+        fwd.stop()
+
+
+def test_rejected_batch_is_dropped_not_retried(tmp_path):
+    class RejectFirstTransport:
+        def __init__(self):
+            self.sent = []
+
+        def send(self, payload):
+            if not self.sent:
+                self.sent.append(None)
+                raise BatchRejected("HTTP upstream rejected batch with status 400")
+            self.sent.append(payload)
+
+        def close(self):
+            pass
+
+    transport = RejectFirstTransport()
+    fwd = Forwarder("http://unused/", batch_size=1, flush_interval=0.05, spool_dir=str(tmp_path),
+                    transport=transport)
+    try:
+        for i in range(3):
+            fwd.submit({"raw": i})
+        assert _wait_for(lambda: fwd.stats()["sent_samples"] == 2)
+        stats = fwd.stats()
+        assert stats["rejected_batches"] == 1
+        assert stats["dropped_samples"] == 1
+        assert stats["spooled_batches"] == 0  # Later data did not queue behind the poison batch
+    finally:
+        fwd.stop()
+
+
+def test_http_4xx_is_a_rejection_and_5xx_an_outage():
+    class _Status(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            self.send_response(self.server.status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Status)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    transport = HttpTransport(f"http://127.0.0.1:{server.server_address[1]}/")
+    try:
+        server.status = 422
+        with pytest.raises(BatchRejected):
+            transport.send(b"x")
+        for status in (503, 408, 429):
+            server.status = status
+            with pytest.raises(ForwardError) as excinfo:
+                transport.send(b"x")
+            assert not isinstance(excinfo.value, BatchRejected)
+    finally:
+        transport.close()
+        server.shutdown()
+        server.server_close()
+
+
+def test_rate_limited_batches_are_spooled_and_delivered(tmp_path):
+    class _RateLimited(_Collector):
+        def do_POST(self):
+            if self.server.limited:
+                self.server.limited -= 1
+                self.rfile.read(int(self.headers["Content-Length"]))
+                self.send_response(429)
+                self.send_header("Retry-After", "1")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            super().do_POST()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _RateLimited)
+    server.batches = []
+    server.peers = set()
+    server.limited = 1
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    fwd = Forwarder(_url(server), batch_size=1, flush_interval=0.05, spool_dir=str(tmp_path))
+    try:
+        for i in range(3):
+            fwd.submit({"raw": i})
+        assert _wait_for(lambda: fwd.stats()["sent_batches"] == 3)
+        assert sorted(b[0]["raw"] for b in server.batches) == [0, 1, 2]
+        stats = fwd.stats()
+        assert stats["failures"] == 1
+        assert stats["rejected_batches"] == 0 and stats["dropped_samples"] == 0
+    finally:
+        fwd.stop()
+        server.shutdown()
+        server.server_close()
+
+
+def test_retry_after_accepts_seconds_and_dates():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after(None) is None and parse_retry_after("soon") is None
+    assert 55 < parse_retry_after(formatdate(time.time() + 60, usegmt=True)) <= 60
+
+
+def test_stop_spools_queue_while_a_send_is_in_flight(tmp_path):
+    class HangingTransport:
+        def __init__(self):
+            self.in_flight = threading.Event()
+            self.release = threading.Event()
+
+        def send(self, payload):
+            self.in_flight.set()
+            self.release.wait(5)  # Like an HTTP request waiting out its timeout
+            raise ForwardError("timed out")
+
+        def close(self):
+            pass
+
+    transport = HangingTransport()
+    fwd = Forwarder("http://unused/", batch_size=1, flush_interval=0.05, spool_dir=str(tmp_path),
+                    transport=transport)
+    try:
+        fwd.submit({"raw": 0})
+        assert transport.in_flight.wait(2)
+        for i in range(1, 4):
+            fwd.submit({"raw": i})
+        start = time.monotonic()
+        fwd.stop(timeout=0.1)
+        assert time.monotonic() - start < 0.5
+        spooled = []
+        for name in sorted(os.listdir(tmp_path)):
+            with open(tmp_path / name, "rb") as f:
+                spooled += [json.loads(line)["raw"] for line in gzip.decompress(f.read()).splitlines()]
+        assert spooled == [1, 2, 3]
+    finally:
+        transport.release.set()
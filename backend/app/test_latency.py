@@ -0,0 +1,107 @@
+"""
+Unit tests for per-sample sequence IDs and latency tracing.
+"""
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main_mod
+from app.latency import LatencyTracker
+from app.sample_hub import SampleHub
+
+
+def test_tracker_summarizes_and_bounds_each_stage():
+    tracker = LatencyTracker(window=10)
+    for i in range(100):
+        tracker.record("read_to_send", i / 1000.0)
+    tracker.record("client_rtt", -1.0)  # Clock skew noise is ignored
+    summary = tracker.summary()
+    assert summary["read_to_send"]["count"] == 10
+    assert summary["read_to_send"]["max_ms"] == pytest.approx(99.0)
+    assert summary["client_rtt"] == {"count": 0}
+
+
+def test_hub_wakes_waiters_on_newer_sample():
+    async def scenario():
+        hub = SampleHub()
+        waiter = asyncio.ensure_future(hub.wait_for_newer(0, timeout=5))
+        await asyncio.sleep(0)
+        hub.publish({"seq": 1}, {"t_read": time.monotonic(), "t_validate": time.monotonic()})
+        assert await waiter is True
+        assert await hub.wait_for_newer(1, timeout=0.01) is False
+        return hub
+
+    hub = asyncio.run(scenario())
+    assert hub.seq == 1
+    assert hub.tracker.summary()["read_to_validate"]["count"] == 1
+
+
+def test_ws_frames_are_sequenced_and_traced(monkeypatch):
+    monkeypatch.setattr(main_mod.config, "SERIAL_PORT", "sim://?rate=50&seed=3")
+    monkeypatch.setattr(main_mod.config, "STATE_FILE", "")
+    monkeypatch.setattr(main_mod.config, "WS_MIN_SEND_INTERVAL", 0.0)
+    monkeypatch.setattr(main_mod, "sample_hub", SampleHub())
+    with TestClient(main_mod.app) as client:
+        with client.websocket_connect("/ws") as ws:
+            seqs = []
+            while len(seqs) < 5:
+                frame = ws.receive_json()
+                if frame.get("seq"):
+                    seqs.append(frame["seq"])
+                    assert "read_at" in frame
+                    ws.send_json({"ack": frame["seq"], "received_at": time.time()})
+            assert seqs == sorted(seqs)
+            assert len(set(seqs)) == len(seqs)
+        stats = client.get("/api/latency").json()
+    assert stats["latest_seq"] >= seqs[-1]
+    for stage in ("read_to_validate", "validate_to_publish", "publish_to_send", "read_to_send"):
+        assert stats["stages"][stage]["count"] > 0
+    assert stats["stages"]["client_rtt"]["count"] > 0
+    # Pushed on arrival rather than on a one-second timer
+    assert stats["stages"]["publish_to_send"]["p50_ms"] < 500
+
+
+def test_malformed_acks_do_not_stop_the_stream(monkeypatch):
+    monkeypatch.setattr(main_mod.config, "SERIAL_PORT", "sim://?rate=50&seed=6")
+    monkeypatch.setattr(main_mod.config, "STATE_FILE", "")
+    monkeypatch.setattr(main_mod.config, "WS_MIN_SEND_INTERVAL", 0.0)
+    monkeypatch.setattr(main_mod, "sample_hub", SampleHub())
+    with TestClient(main_mod.app) as client:
+        with client.websocket_connect("/ws") as ws:
+            for bad in ({"ack": {"x": 1}}, {"ack": [1]}, {"ack": True}, [1], "not json"):
+                if isinstance(bad, str):
+                    ws.send_text(bad)
+                else:
+                    ws.send_json(bad)
+            seqs = set()
+            while len(seqs) < 5:
+                frame = ws.receive_json()
+                if frame.get("seq"):
+                    seqs.add(frame["seq"])
+
+
+def test_acks_of_heartbeat_resends_do_not_inflate_client_rtt(monkeypatch):
+    monkeypatch.setattr(main_mod.config, "SERIAL_PORT", "sim://?rate=50&seed=7")
+    monkeypatch.setattr(main_mod.config, "STATE_FILE", "")
+    monkeypatch.setattr(main_mod.config, "WS_SEND_INTERVAL", 0.1)
+    monkeypatch.setattr(main_mod.config, "WS_MIN_SEND_INTERVAL", 0.0)
+    monkeypatch.setattr(main_mod, "sample_hub", SampleHub())
+    with TestClient(main_mod.app) as client:
+        deadline = time.monotonic() + 5.0
+        while not main_mod.sample_hub.seq and time.monotonic() < deadline:
+            time.sleep(0.02)
+        main_mod.serial_reader.stop()  # The scale stalls; only heartbeats follow
+        with client.websocket_connect("/ws") as ws:
+            seqs = []
+            for _ in range(6):
+                frame = ws.receive_json()
+                seqs.append(frame["seq"])
+                # Ack every frame, as a client that does not dedup would
+                ws.send_json({"ack": frame["seq"], "received_at": time.time()})
+            time.sleep(0.1)  # Let the last ack reach the receiver
+        assert len(set(seqs)) == 1 and seqs[0] > 0
+        rtt = client.get("/api/latency").json()["stages"]["client_rtt"]
+    # Resends of one seq are matched once, not timed against the first send
+    assert rtt["count"] == 1 and rtt["max_ms"] < 100
@@ -15,11 +15,15 @@ def test_api_weight_default():
         assert k in data["weights_newton"]
 
 # Edge case: Simulate serial_reader returning negative values
-# This would require mocking serial_reader.get_latest_data_safe
+# The endpoint serves the latest sample published to the sample hub
+import asyncio
+import threading
+import time
 import app.main as main_mod
+from app.sample_hub import SampleHub
 
 def test_api_weight_negative(monkeypatch):
-    def mock_get_latest_data_safe():
+    def mock_latest_sample():
         return {
             "raw": -153425,
             "grams": -671.1932,
@@ -34,7 +38,10 @@ def test_api_weight_negative(monkeypatch):
                 "Pulsar": -6.711932e11
             }
         }
-    monkeypatch.setattr(main_mod.serial_reader, "get_latest_data_safe", mock_get_latest_data_safe)
+    hub = SampleHub()
+    hub.publish(dict(mock_latest_sample(), seq=1))
+    monkeypatch.setattr(main_mod, "sample_hub", hub)
+    monkeypatch.setattr(main_mod, "serial_reader", object())
     client = TestClient(main_mod.app)
     response = client.get("/api/weight")
     assert response.status_code == 200
@@ -54,3 +61,58 @@ def test_api_weight_none(monkeypatch):
     assert data["raw"] == 0.0
     assert data["grams"] == 0.0
     assert data["weights_newton"]["Sun"] == 0.0
+
+# Conditional GET and long-poll keyed by sample sequence
+
+def _published_hub(monkeypatch, seq=1):
+    hub = SampleHub()
+    hub.publish({"raw": 1, "grams": 2.0, "mass_kg": 0.002,
+                 "weights_newton": {k: 0.1 for k in ["Sun", "Mercury", "Earth", "Moon", "Uranus", "Pluto", "Pulsar"]},
+                 "seq": seq})
+    monkeypatch.setattr(main_mod, "sample_hub", hub)
+    monkeypatch.setattr(main_mod, "serial_reader", object())
+    return hub
+
+def test_api_weight_etag_returns_304_when_unchanged(monkeypatch):
+    _published_hub(monkeypatch)
+    client = TestClient(main_mod.app)
+    first = client.get("/api/weight")
+    assert first.status_code == 200
+    assert first.json()["seq"] == 1
+    etag = first.headers["etag"]
+    second = client.get("/api/weight", headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.content == b""
+    assert second.headers["etag"] == etag
+    stale = client.get("/api/weight", headers={"If-None-Match": '"someone-else-1"'})
+    assert stale.status_code == 200
+
+def test_api_weight_long_poll_wakes_on_new_sample(monkeypatch):
+    hub = _published_hub(monkeypatch)
+    monkeypatch.setattr(main_mod.config, "STATE_FILE", "")
+    with TestClient(main_mod.app) as client:
+        loop = client.portal.call(asyncio.get_running_loop)
+        def publish_later():
+            time.sleep(0.2)
+            loop.call_soon_threadsafe(hub.publish, dict(hub.data, seq=2, grams=5.0))
+        publisher = threading.Thread(target=publish_later)
+        publisher.start()
+        start = time.monotonic()
+        response = client.get("/api/weight?after_seq=1&timeout=10")
+        elapsed = time.monotonic() - start
+        publisher.join()
+    assert response.status_code == 200
+    assert response.json()["seq"] == 2
+    assert response.json()["grams"] == 5.0
+    assert 0.1 < elapsed < 5
+
+def test_api_weight_long_poll_times_out_with_current_sample(monkeypatch):
+    _published_hub(monkeypatch, seq=7)
+    client = TestClient(main_mod.app)
+    start = time.monotonic()
+    response = client.get("/api/weight?after_seq=7&timeout=0.2")
+    assert time.monotonic() - start >= 0.2
+    assert response.status_code == 200
+    assert response.headers["x-sample-seq"] == "7"
+    etag = response.headers["etag"]
+    assert client.get("/api/weight?after_seq=7&timeout=0.1", headers={"If-None-Match": etag}).status_code == 304
@@ -2,6 +2,9 @@
 Unit tests for ArduinoWeightData and WeightsNewton models.
 """
 import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main_mod
 from app.models import ArduinoWeightData, WeightsNewton
 
 def test_valid_payload():
@@ -53,3 +56,10 @@ def test_invalid_type():
     }
     with pytest.raises(Exception):
         ArduinoWeightData(**payload)
+
+
+def test_weight_schema_documents_stream_metadata():
+    schema = TestClient(main_mod.app).get("/openapi.json").json()
+    fields = schema["components"]["schemas"]["ArduinoWeightData"]["properties"]
+    assert {"seq", "read_at", "ts"} <= set(fields)
+    assert "304" in schema["paths"]["/api/weight"]["get"]["responses"]
@@ -0,0 +1,217 @@
+"""
+Unit tests for the sample history and relay/mirror mode.
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main_mod
+from app.relay import RelayReader
+from app.sample_hub import SampleHub
+from app.simulator import make_payload
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def sample(seq):
+    data = make_payload(seq / 10.0)
+    data["seq"] = seq
+    return data
+
+
+def wait_until(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+class FakeUpstream:
+    """Minimal upstream speaking the /api/weight long-poll and /api/history protocol."""
+
+    def __init__(self, port=0, samples=()):
+        self.samples = list(samples)
+        self.cond = threading.Condition()
+        self.connections = set()
+        self.long_poll = True
+        self.requests = 0
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                upstream.connections.add(self.connection)
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                after = int(query.get("after_seq", 0))
+                with upstream.cond:
+                    upstream.requests += 1
+                    if url.path == "/api/weight" and upstream.long_poll:
+                        upstream.cond.wait_for(
+                            lambda: upstream.samples and upstream.samples[-1]["seq"] > after,
+                            timeout=min(float(query.get("timeout", 0)), 0.2),
+                        )
+                    if url.path == "/api/weight":
+                        body = upstream.samples[-1] if upstream.samples else {"seq": 0}
+                    else:
+                        newer = [s for s in upstream.samples if s["seq"] > after]
+                        body = {"samples": newer[: int(query.get("limit", 500))]}
+                payload = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def publish(self, *seqs):
+        with self.cond:
+            self.samples.extend(sample(seq) for seq in seqs)
+            self.cond.notify_all()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+        # Drop keep-alive connections too, as a dying process would
+        for conn in list(self.connections):
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+def test_history_after_returns_oldest_first_and_resets_on_restart():
+    hub = SampleHub(history_size=5)
+    for seq in range(1, 9):
+        hub.publish({"seq": seq}, {})
+    assert [s["seq"] for s in hub.history_after(0, 10)] == [4, 5, 6, 7, 8]
+    assert [s["seq"] for s in hub.history_after(5, 2)] == [6, 7]
+    assert hub.history_after(8, 10) == []
+    hub.publish({"seq": 1}, {})  # Upstream restarted without state
+    assert [s["seq"] for s in hub.history_after(0, 10)] == [1]
+
+
+def test_history_endpoint(monkeypatch):
+    hub = SampleHub()
+    for seq in range(1, 4):
+        hub.publish(sample(seq), {})
+    monkeypatch.setattr(main_mod, "sample_hub", hub)
+    monkeypatch.setattr(main_mod, "serial_reader", object())
+    body = TestClient(main_mod.app).get("/api/history?after_seq=1").json()
+    assert body["latest_seq"] == 3
+    assert body["oldest_seq"] == 1
+    assert [s["seq"] for s in body["samples"]] == [2, 3]
+
+
+def test_relay_keeps_upstream_seq_and_backfills_gaps():
+    upstream = FakeUpstream()
+    upstream.publish(1, 2)
+    received = []
+    relay = RelayReader(upstream.url, poll_timeout=0.2)
+    relay.add_listener(lambda data, trace: received.append(data["seq"]))
+    try:
+        assert wait_until(lambda: received == [2])
+        assert relay.connected
+        # Several samples land between two polls: the relay recovers the skipped ones
+        upstream.publish(3, 4, 5, 6)
+        assert wait_until(lambda: received[-1:] == [6])
+        assert received == [2, 3, 4, 5, 6]
+        assert relay.stats["backfilled"] >= 1
+        assert relay.seq == 6
+    finally:
+        relay.stop()
+        upstream.close()
+    assert not relay._thread.is_alive()
+
+
+def test_relay_reconnects_after_upstream_outage():
+    upstream = FakeUpstream()
+    upstream.publish(1)
+    port = upstream.server.server_address[1]
+    received = []
+    relay = RelayReader(upstream.url, poll_timeout=0.2, max_backoff=0.2)
+    relay.add_listener(lambda data, trace: received.append(data["seq"]))
+    try:
+        assert wait_until(lambda: received == [1])
+        upstream.close()
+        assert wait_until(lambda: not relay.connected)
+        # Same address comes back with samples published during the outage
+        upstream = FakeUpstream(port, [sample(seq) for seq in range(1, 5)])
+        assert wait_until(lambda: received[-1:] == [4])
+        assert received == [1, 2, 3, 4]
+        assert relay.stats["reconnects"] >= 1
+    finally:
+        relay.stop()
+        upstream.close()
+
+
+def test_relay_backs_off_when_upstream_answers_without_data():
+    upstream = FakeUpstream()
+    upstream.long_poll = False  # Answers instantly with the seq 0 default payload
+    relay = RelayReader(upstream.url, poll_timeout=25, max_backoff=1.0)
+    try:
+        time.sleep(1.5)
+        assert relay.connected
+        assert upstream.requests < 10
+        # Backoff resets as soon as data flows
+        upstream.publish(1)
+        assert wait_until(lambda: relay.seq == 1)
+    finally:
+        relay.stop()
+        upstream.close()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_relay_mirrors_a_second_local_instance(monkeypatch, tmp_path):
+    pytest.importorskip("uvicorn")
+    port = free_port()
+    env = dict(os.environ, SERIAL_PORT="sim://?rate=20&seed=1", STATE_FILE="", RELAY_UPSTREAM="")
+    upstream = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    monkeypatch.setattr(main_mod.config, "RELAY_UPSTREAM", f"http://127.0.0.1:{port}")
+    monkeypatch.setattr(main_mod.config, "RELAY_POLL_TIMEOUT", 1.0)
+    monkeypatch.setattr(main_mod.config, "STATE_FILE", "")
+    monkeypatch.setattr(main_mod, "sample_hub", SampleHub())
+    try:
+        with TestClient(main_mod.app) as client:
+            assert wait_until(lambda: main_mod.sample_hub.seq >= 20, timeout=20)
+            mirrored = client.get("/api/weight")
+            assert mirrored.headers["X-Sample-Seq"] == str(mirrored.json()["seq"])
+            assert client.get("/health").json()["serial_connected"] is True
+            seqs = [s["seq"] for s in client.get("/api/history").json()["samples"]]
+        # Sequence IDs are the upstream's and arrive without holes
+        assert seqs == list(range(seqs[0], seqs[0] + len(seqs)))
+    finally:
+        upstream.terminate()
+        upstream.wait(timeout=10)
@@ -0,0 +1,57 @@
+"""
+Short soak run plus lifecycle tests for the structures the soak harness watches.
+"""
+import asyncio
+import contextlib
+import os
+import threading
+import time
+
+from app.serial_reader import SerialReader
+from app.soak import check_report, run_soak
+from app.websocket_manager import WebSocketManager
+
+
+def test_short_soak_is_flat():
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        report = asyncio.run(run_soak(duration=3.0, warmup=1.0, concurrency=20, report_every=1.0))
+    assert report["final"]["sessions"] > 1000
+    assert check_report(report) == []
+
+
+def test_check_report_flags_leaks():
+    base = {"rss_bytes": 0, "threads": 2, "fds": 8, "active_connections": 0, "latency_p95_s": None}
+    leaky = dict(base, rss_bytes=64 * 1024 * 1024, threads=3, fds=20, active_connections=5)
+    failures = check_report({"baseline": base, "final": leaky, "snapshots": []})
+    assert len(failures) == 4
+
+
+def test_websocket_manager_disconnect_is_idempotent():
+    class FakeSocket:
+        async def accept(self, subprotocol=None):
+            pass
+
+    manager = WebSocketManager()
+    sockets = [FakeSocket() for _ in range(1000)]
+    for ws in sockets:
+        asyncio.run(manager.connect(ws))
+    for ws in sockets:
+        manager.disconnect(ws)
+        manager.disconnect(ws)
+    assert len(manager.active_connections) == 0
+
+
+def test_reader_keeps_up_with_fast_source_and_stops_cleanly():
+    threads_before = threading.active_count()
+    reader = SerialReader(port="sim://?rate=200&seed=1")
+    try:
+        deadline = time.monotonic() + 3
+        while reader._serial is None or reader._serial.lines_sent < 100:
+            assert time.monotonic() < deadline, "reader fell behind the simulated source"
+            time.sleep(0.05)
+        assert reader.get_latest_data_safe() is not None
+    finally:
+        reader.stop()
+    assert not reader._thread.is_alive()
+    assert reader._serial is None
+    assert threading.active_count() == threads_before
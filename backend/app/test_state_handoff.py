@@ -0,0 +1,115 @@
+"""
+Unit tests for restart handoff: persisted state, socket activation and fast stop.
+"""
+import json
+import os
+import time
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+import app.main as main_mod
+from app import socket_activation
+from app.downsample import ChartSeries
+from app.sample_hub import SampleHub
+from app.serial_reader import SerialReader
+from app.state_store import StateStore
+
+
+def test_state_store_roundtrip_and_stale_sample(tmp_path):
+    path = str(tmp_path / "state" / "state.json")
+    store = StateStore(path, max_sample_age=60)
+    store.save(42, {"grams": 1.0, "seq": 42}, {"offset": -161100})
+    state = store.load()
+    assert state == {"seq": 42, "sample": {"grams": 1.0, "seq": 42}, "calibration": {"offset": -161100}}
+
+    with open(path) as f:
+        saved = json.load(f)
+    saved["saved_at"] -= 120
+    with open(path, "w") as f:
+        json.dump(saved, f)
+    stale = store.load()
+    assert stale["sample"] is None
+    assert stale["seq"] == 42
+    assert stale["calibration"] == {"offset": -161100}
+
+
+def test_state_store_ignores_missing_or_corrupt_file(tmp_path):
+    path = tmp_path / "state.json"
+    store = StateStore(str(path))
+    assert store.load()["seq"] == 0
+    path.write_text("{not json")
+    assert store.load() == {"seq": 0, "sample": None, "calibration": None}
+
+
+def test_listen_fd_follows_sd_listen_fds(monkeypatch):
+    monkeypatch.setenv("LISTEN_PID", str(os.getpid()))
+    monkeypatch.setenv("LISTEN_FDS", "1")
+    assert socket_activation.listen_fd() == 3
+    assert "LISTEN_FDS" not in os.environ
+    monkeypatch.setenv("LISTEN_PID", str(os.getpid() + 1))
+    monkeypatch.setenv("LISTEN_FDS", "1")
+    assert socket_activation.listen_fd() is None
+
+
+def test_restart_restores_last_sample_and_sequence(monkeypatch, tmp_path):
+    monkeypatch.setattr(main_mod.config, "STATE_FILE", str(tmp_path / "state.json"))
+    monkeypatch.setattr(main_mod.config, "SERIAL_PORT", "sim://?rate=50&seed=5")
+    monkeypatch.setattr(main_mod, "sample_hub", SampleHub())
+    monkeypatch.setattr(main_mod, "chart_series", ChartSeries(capacity=1000))
+    with TestClient(main_mod.app) as client:
+        deadline = time.monotonic() + 5
+        while main_mod.sample_hub.seq < 3:
+            assert time.monotonic() < deadline
+            time.sleep(0.02)
+        main_mod.serial_reader._serial.inject('{"event":"tare","new_offset":-161100}')
+        while main_mod.serial_reader.calibration is None:
+            assert time.monotonic() < deadline
+            time.sleep(0.02)
+        start = time.monotonic()
+    # Shutdown (reader stop, state save) is well under a second
+    assert time.monotonic() - start < 1.0
+    last = main_mod.sample_hub.seq
+    charted = main_mod.chart_series.snapshot()
+
+    # A "new process": empty hub and a port that never produces data
+    monkeypatch.setattr(main_mod, "sample_hub", SampleHub())
+    monkeypatch.setattr(main_mod, "chart_series", ChartSeries(capacity=1000))
+    monkeypatch.setattr(main_mod.config, "SERIAL_PORT", "/dev/does-not-exist")
+    with TestClient(main_mod.app) as client:
+        response = client.get("/api/weight")
+        assert response.json()["seq"] == last
+        assert response.json()["grams"] != 0.0 or response.json()["raw"] != 0.0
+        assert client.get("/api/calibration").json()["calibration"]["offset"] == -161100
+        assert np.array_equal(main_mod.chart_series.snapshot(), charted)
+        assert client.get("/api/history?points=100&window=60").json()["points"] > 0
+        start = time.monotonic()
+    # Stopping while the reader waits to retry the port is prompt too
+    assert time.monotonic() - start < 1.0
+
+
+def test_stop_is_prompt_during_retry_wait():
+    reader = SerialReader(port="/dev/does-not-exist")
+    time.sleep(0.3)  # Reader is now in its 5 s retry wait
+    start = time.monotonic()
+    reader.stop()
+    assert time.monotonic() - start < 0.5
+    assert not reader._thread.is_alive()
+
+
+def test_restored_seq_without_sample_is_not_advertised(monkeypatch, tmp_path):
+    path = str(tmp_path / "state.json")
+    StateStore(path).save(42, None, None)
+    monkeypatch.setattr(main_mod.config, "STATE_FILE", path)
+    monkeypatch.setattr(main_mod.config, "SERIAL_PORT", "/dev/does-not-exist")
+    monkeypatch.setattr(main_mod, "sample_hub", SampleHub())
+    with TestClient(main_mod.app) as client:
+        assert main_mod.sample_hub.seq == 0
+        assert main_mod.serial_reader.seq == 42  # The next sample continues at 43
+        response = client.get("/api/weight")
+        assert response.headers["X-Sample-Seq"] == "0"
+        # A long-poll for "anything newer" now really waits instead of returning at once
+        start = time.monotonic()
+        client.get("/api/weight?after_seq=0&timeout=0.3")
+        assert time.monotonic() - start >= 0.25
+    assert StateStore(path).load()["seq"] == 42
@@ -0,0 +1,91 @@
+"""
+Unit tests for the data-freshness watchdog and in-place reader restarts.
+"""
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+import app.main as main_mod
+from app.sample_hub import SampleHub
+from app.serial_reader import SerialReader
+from app.watchdog import FreshnessWatchdog
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_watchdog_flags_stale_data_and_backs_off():
+    hub = SampleHub()
+    watchdog = FreshnessWatchdog(hub, slo=0.05, max_backoff=0.2)
+    assert watchdog.check() is False  # Startup counts as fresh until the SLO passes
+    time.sleep(0.06)
+    assert watchdog.check() is True
+    assert watchdog.check() is False  # The restarted reader gets a backoff period
+    assert watchdog.status()["fresh"] is False
+    hub.publish({"seq": 1}, {})
+    assert watchdog.check() is False
+    assert watchdog.status()["fresh"] is True
+    assert watchdog.status()["data_age_seconds"] < 0.05
+
+
+def test_restart_keeps_sequence_and_listeners():
+    reader = SerialReader(port="sim://?rate=50&seed=2")
+    seen = []
+    reader.add_listener(lambda data, trace: seen.append(data["seq"]))
+    try:
+        assert wait_until(lambda: len(seen) >= 3)
+        reader._stop_event.set()  # The reader thread dies, as after exhausting its retries
+        assert wait_until(lambda: not reader.alive)
+        before = reader.seq
+        reader.restart()
+        assert reader.alive and reader.restarts == 1
+        assert wait_until(lambda: reader.seq > before + 2)
+        assert seen == list(range(1, len(seen) + 1))
+    finally:
+        reader.stop()
+
+
+def test_stop_during_an_in_flight_restart_leaves_no_reader_behind():
+    reader = SerialReader(port="sim://?rate=50&seed=3")
+    halt = reader._halt
+
+    def slow_halt(timeout):
+        time.sleep(0.3)  # The watchdog's restart is still tearing down when shutdown begins
+        halt(timeout)
+
+    reader._halt = slow_halt
+    restarting = threading.Thread(target=reader.restart)
+    restarting.start()
+    time.sleep(0.1)
+    reader.stop()
+    restarting.join()
+    assert reader.restarts == 1
+    assert not reader.alive and reader._serial is None
+    reader.restart()  # A restart arriving after the final stop is ignored
+    assert not reader.alive and reader.restarts == 1
+
+
+def test_watchdog_restarts_reader_when_firmware_hangs(monkeypatch):
+    monkeypatch.setattr(main_mod.config, "SERIAL_PORT", "sim://?rate=50&seed=4")
+    monkeypatch.setattr(main_mod.config, "STATE_FILE", "")
+    monkeypatch.setattr(main_mod.config, "WATCHDOG_SLO", 0.3)
+    monkeypatch.setattr(main_mod.config, "WATCHDOG_INTERVAL", 0.05)
+    monkeypatch.setattr(main_mod, "sample_hub", SampleHub())
+    with TestClient(main_mod.app) as client:
+        assert wait_until(lambda: main_mod.sample_hub.seq >= 3)
+        # Port stays open but nothing arrives any more
+        main_mod.serial_reader._serial._produce = lambda: None
+        assert wait_until(lambda: client.get("/health").json()["freshness"]["restarts"] >= 1)
+        hung_at = main_mod.sample_hub.seq
+        assert wait_until(lambda: main_mod.sample_hub.seq > hung_at)
+        health = client.get("/health").json()
+        assert health["serial_connected"] is True
+        assert health["reader_alive"] is True
+        assert wait_until(lambda: client.get("/health").json()["freshness"]["fresh"])
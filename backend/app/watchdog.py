@@ -0,0 +1,78 @@
+"""
+FreshnessWatchdog: Restarts a stalled reader when samples stop arriving.
+
+An open serial port says little on its own: the reader thread may have given
+up, or the firmware may have hung. The watchdog compares the age of the newest
+sample with an SLO and restarts the reader in place when it is exceeded,
+backing off while restarts do not help (e.g. the scale is unplugged).
+"""
+import asyncio
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+
+class FreshnessWatchdog:
+    def __init__(self, hub, slo: float, check_interval: float = 1.0, max_backoff: float = 300.0):
+        self.hub = hub
+        self.slo = slo
+        self.check_interval = check_interval
+        self.max_backoff = max_backoff
+        self.started_at = time.monotonic()
+        self.stale = False
+        self.restarts = 0
+        self.last_restart_at: Optional[float] = None  # Wall clock, for reporting
+        self._backoff = slo
+        self._next_restart_at = 0.0
+
+    def data_age(self) -> Optional[float]:
+        """Seconds since the newest sample was published (None before the first one)."""
+        published = self.hub.trace.get("t_publish")
+        return None if published is None else time.monotonic() - published
+
+    def check(self) -> bool:
+        """Update the staleness flag; returns True when a restart is due."""
+        now = time.monotonic()
+        age = self.data_age()
+        # Before the first sample, count from startup so a reader that never delivers is caught too
+        self.stale = (age if age is not None else now - self.started_at) > self.slo
+        if not self.stale:
+            self._backoff = self.slo
+            return False
+        if now < self._next_restart_at:
+            return False
+        # Give the restarted reader a full backoff period before judging it again
+        self._next_restart_at = now + self._backoff
+        self._backoff = min(self.max_backoff, self._backoff * 2)
+        return True
+
+    async def run(self, get_reader: Callable):
+        """Check every check_interval seconds; get_reader returns the current reader."""
+        while True:
+            await asyncio.sleep(self.check_interval)
+            if not self.check():
+                continue
+            restart = getattr(get_reader(), "restart", None)
+            if restart is None:
+                continue  # Nothing to restart (e.g. relay mode, which reconnects by itself)
+            age = self.data_age()
+            print(f"Watchdog: no fresh sample for {'ever' if age is None else f'{age:.1f}s'} "
+                  f"(SLO {self.slo}s), restarting reader")
+            self.restarts += 1
+            self.last_restart_at = time.time()
+            try:
+                await asyncio.to_thread(restart)
+            except Exception as e:
+                print(f"Watchdog: reader restart failed: {e}")
+
+    def status(self) -> dict:
+        """Cheap snapshot for /health."""
+        age = self.data_age()
+        restarted = self.last_restart_at
+        return {
+            "data_age_seconds": None if age is None else round(age, 3),
+            "fresh": not self.stale,
+            "slo_seconds": self.slo,
+            "restarts": self.restarts,
+            "last_restart_at": None if restarted is None else datetime.fromtimestamp(restarted).isoformat(),
+        }
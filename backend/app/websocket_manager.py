@@ -2,23 +2,23 @@
 WebSocketManager: Handles WebSocket connections and broadcasting.
 """
 from fastapi import WebSocket
-from typing import List
+from typing import Optional, Set
 
 class WebSocketManager:
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        # A set keeps connect/disconnect O(1) however many clients come and go
+        self.active_connections: Set[WebSocket] = set()
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+    async def connect(self, websocket: WebSocket, subprotocol: Optional[str] = None):
+        await websocket.accept(subprotocol=subprotocol)
+        self.active_connections.add(websocket)
 
     def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+        self.active_connections.discard(websocket)
 
     async def broadcast(self, message: dict):
         disconnected = []
-        for connection in self.active_connections:
+        for connection in list(self.active_connections):
             try:
                 await connection.send_json(message)
             except Exception as e:
@@ -31,7 +31,7 @@ class WebSocketManager:
     
     async def close_all(self):
         """Close all active WebSocket connections."""
-        for connection in self.active_connections.copy():
+        for connection in list(self.active_connections):
             try:
                 await connection.close()
             except Exception as e:
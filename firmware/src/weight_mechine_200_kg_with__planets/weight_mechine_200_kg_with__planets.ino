@@ -89,6 +89,7 @@ void loop() {
   doc["raw"]     = raw;
   doc["grams"]   = grams;
   doc["mass_kg"] = massKg;
+  doc["ts"]      = millis();   // device timestamp (ms since boot) for latency tracing
 
   JsonObject wN = doc.createNestedObject("weights_newton");
   for (auto &p : planets) wN[p.name] = massKg * p.g;
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import {
   ThemeProvider,
   createTheme,
@@ -298,6 +298,10 @@ const darkTheme = createTheme({
   },
 });
 
+// Display smoothing: average the readings of the last few seconds
+const SMOOTHING_WINDOW_MS = 5000;
+const MAX_BUFFERED_READINGS = 500;
+
 function App() {
   const [sensorData, setSensorData] = useState({
     raw: 0,
@@ -318,8 +322,10 @@ function App() {
   const [isLoading, setIsLoading] = useState(true);
   const [selectedPlanet, setSelectedPlanet] = useState('Earth');
   
-  // Buffer to store the last 5 readings for averaging
-  const [dataBuffer, setDataBuffer] = useState([]);
+  // Readings from the last SMOOTHING_WINDOW_MS, averaged for display. Kept in a
+  // ref: the backend pushes every sample, and re-rendering (or re-arming the
+  // display timer) per message would starve the display at high sample rates
+  const dataBuffer = useRef([]);
 
   // Function to calculate average of multiple data readings
   const calculateAverageData = (readings) => {
@@ -355,11 +361,15 @@ function App() {
 
   // WebSocket connection
   useEffect(() => {
+    // Reconnect quickly so a backend restart goes unnoticed, backing off if it stays down
+    let retryDelay = 250;
+
     const connectWebSocket = () => {
       const ws = new WebSocket('ws://localhost:8000/ws');
       
       ws.onopen = () => {
         console.log('Connected to WebSocket');
+        retryDelay = 250;
         setIsConnected(true);
         setIsLoading(false);
       };
@@ -367,13 +377,20 @@ function App() {
       ws.onmessage = (event) => {
         try {
           const data = JSON.parse(event.data);
-          
-          // Add new data to buffer
-          setDataBuffer(prevBuffer => {
-            const newBuffer = [...prevBuffer, data];
-            // Keep only the last 10 readings
-            return newBuffer.slice(-5);
-          });
+
+          // Heartbeat resends of the same sample are neither buffered nor acked
+          const buffer = dataBuffer.current;
+          const last = buffer[buffer.length - 1];
+          if (!last || !data.seq || last.data.seq !== data.seq) {
+            // Echo receipt so the backend can measure end-to-end latency
+            if (data.seq) {
+              ws.send(JSON.stringify({ ack: data.seq, received_at: Date.now() / 1000 }));
+            }
+            buffer.push({ data, at: Date.now() });
+            if (buffer.length > MAX_BUFFERED_READINGS) {
+              buffer.shift();
+            }
+          }
           
         } catch (error) {
           console.error('Error parsing WebSocket data:', error);
@@ -383,7 +400,8 @@ function App() {
       ws.onclose = () => {
         console.log('WebSocket disconnected');
         setIsConnected(false);
-        setTimeout(connectWebSocket, 3000);
+        setTimeout(connectWebSocket, retryDelay);
+        retryDelay = Math.min(retryDelay * 2, 3000);
       };
       
       ws.onerror = (error) => {
@@ -396,12 +414,17 @@ function App() {
     connectWebSocket();
   }, []);
 
-  // Effect to process the data buffer every 2 seconds
+  // Update the display from the smoothed buffer at a fixed rate, whatever the sample rate
   useEffect(() => {
     const interval = setInterval(() => {
-      if (dataBuffer.length > 0) {
+      const cutoff = Date.now() - SMOOTHING_WINDOW_MS;
+      const buffer = dataBuffer.current;
+      while (buffer.length > 1 && buffer[0].at < cutoff) {
+        buffer.shift();
+      }
+      if (buffer.length > 0) {
         // Calculate average of all readings in buffer
-        const avgData = calculateAverageData(dataBuffer);
+        const avgData = calculateAverageData(buffer.map(entry => entry.data));
         
         if (avgData) {
           // Replace negative values with 0
@@ -420,7 +443,7 @@ function App() {
     }, 800);
 
     return () => clearInterval(interval);
-  }, [dataBuffer]);
+  }, []);
 
   const celestialBodies = [
     {
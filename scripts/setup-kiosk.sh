@@ -86,19 +86,36 @@ setup_frontend() {
 }
 
 create_backend_service() {
-    echo_info "Creating backend systemd service..."
+    echo_info "Creating backend systemd socket and service..."
     
+    # systemd owns the listening socket, so connections made while the backend
+    # restarts wait in the backlog instead of being refused
+    cat > /etc/systemd/system/weight-exhibit-backend.socket << EOF
+[Unit]
+Description=Weight Exhibit Backend Socket
+
+[Socket]
+ListenStream=0.0.0.0:8000
+Backlog=128
+
+[Install]
+WantedBy=sockets.target
+EOF
+
     cat > /etc/systemd/system/weight-exhibit-backend.service << EOF
 [Unit]
 Description=Weight Exhibit Backend Service
-After=network.target
+After=network.target weight-exhibit-backend.socket
 Wants=network.target
+Requires=weight-exhibit-backend.socket
 
 [Service]
 Type=simple
 User=$USER
 WorkingDirectory=$BACKEND_DIR
 Environment=PATH=$BACKEND_DIR/venv/bin
+# Last reading and tare offset survive restarts in /var/lib/weight-exhibit
+StateDirectory=weight-exhibit
 ExecStart=$BACKEND_DIR/venv/bin/python -m app
 Restart=always
 RestartSec=5
@@ -111,9 +128,10 @@ WantedBy=multi-user.target
 EOF
 
     systemctl daemon-reload
+    systemctl enable weight-exhibit-backend.socket
     systemctl enable weight-exhibit-backend.service
     
-    echo_info "Backend service created and enabled"
+    echo_info "Backend socket and service created and enabled"
 }
 
 create_frontend_service() {
@@ -302,6 +320,7 @@ create_management_scripts() {
     cat > "$SCRIPT_DIR/start.sh" << EOF
 #!/bin/bash
 echo "Starting Weight Exhibit services..."
+systemctl start weight-exhibit-backend.socket
 systemctl start weight-exhibit-backend.service
 systemctl start weight-exhibit-frontend.service
 echo "Services started"
@@ -313,6 +332,7 @@ EOF
 echo "Stopping Weight Exhibit services..."
 systemctl stop weight-exhibit-frontend.service
 systemctl stop weight-exhibit-backend.service
+systemctl stop weight-exhibit-backend.socket
 echo "Services stopped"
 EOF
 